@@ -0,0 +1,56 @@
+"""
+"   Benchmark: per checklist regex/strptime parsing vs bulk date_utils conversion
+"
+"   Usage: python benchmarks/bench_dates.py [nb_checklists]
+"
+"""
+import datetime
+import re
+import sys
+import timeit
+from os.path import dirname, join
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, join(dirname(__file__), '..'))
+from date_utils import to_ebird_dates, to_minutes  # noqa: E402
+
+
+def make_data(n):
+    rng = np.random.default_rng(0)
+    days = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 9000, n), unit='D')
+    seconds = rng.integers(0, 86400 - 3600, n)
+    return pd.DataFrame({
+        'date': days.strftime('%Y-%m-%d'),
+        'start': pd.to_datetime(seconds, unit='s').strftime('%H:%M:%S'),
+        'end': pd.to_datetime(seconds + 3000, unit='s').strftime('%H:%M:%S'),
+    })
+
+
+def per_checklist(df):
+    out = []
+    for g_date, start_time, last_time in zip(df['date'], df['start'], df['end']):
+        g_year, g_mm, g_dd = re.findall(r'(\d{4})-(\d{2})-(\d{2})', g_date, re.DOTALL)[0]
+        s_time = datetime.datetime.strptime(start_time, "%H:%M:%S")
+        l_time = datetime.datetime.strptime(last_time, "%H:%M:%S")
+        out.append((f'{g_mm}/{g_dd}/{g_year}', int(1 + (l_time - s_time).total_seconds() / 60)))
+    return out
+
+
+def bulk(df):
+    dates = to_ebird_dates(df['date'].astype('category'))
+    duration = 1 + to_minutes(df['end']) - to_minutes(df['start'])
+    return dates, duration
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    df = make_data(n)
+    t_old = min(timeit.repeat(lambda: per_checklist(df), number=1, repeat=3))
+    t_new = min(timeit.repeat(lambda: bulk(df), number=1, repeat=3))
+    print(f'{n} checklists: per checklist {t_old:.3f}s, bulk {t_new:.3f}s, speedup x{t_old / t_new:.1f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+"   Benchmark: DataFrame.to_sql vs obs2ebird.bulk_load, in rows/sec
+"
+"   Usage: python benchmarks/bench_import.py [nb_rows] [--mysql]
+"
+"   The sqlite paths run on a temporary database. With --mysql, the MySQL database of the config file is used
+"   (its observation table is replaced), with inserts and, if allowed by the server, LOAD DATA LOCAL INFILE.
+"
+"""
+import sys
+import tempfile
+import time
+from os.path import dirname, join
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, join(dirname(__file__), '..'))
+import obs2ebird  # noqa: E402
+from get_config import get_config  # noqa: E402
+
+
+def make_data(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'species name': rng.choice(['Merel', 'Koolmees', 'Pimpelmees', 'Roodborst', 'Vink'], n),
+        'date': (pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, n), unit='D')).strftime(
+            '%Y-%m-%d'),
+        'time': pd.to_datetime(rng.integers(0, 86400, n), unit='s').strftime('%H:%M:%S'),
+        'number': rng.integers(1, 10, n),
+        'location': rng.choice(['Park A - north', 'Forest B', 'Lake C - east'], n),
+        'lat': 50 + rng.random(n),
+        'lng': 4 + rng.random(n),
+        'notes': '',
+    })
+
+
+def timed(label, n, func):
+    t = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - t
+    print(f'{label:<40} {elapsed:7.2f}s {n / elapsed:12,.0f} rows/sec')
+
+
+def to_sql(d, table, sqlEngine):
+    if obs2ebird.is_sqlite():
+        d.to_sql(name=table, con=sqlEngine, if_exists='replace')
+        sqlEngine.commit()
+    else:
+        with sqlEngine.begin() as cnx:
+            d.to_sql(name=table, con=cnx, if_exists='replace')
+
+
+def main():
+    n = int(next((a for a in sys.argv[1:] if a.isdigit()), 200000))
+    d = make_data(n)
+    with tempfile.TemporaryDirectory() as directory:
+        config = {'default': {'db_dialect': 'sqlite'}, 'sqlite': {'db': join(directory, 'bench.sqlite')}}
+        with obs2ebird.use_config(config):
+            sqlEngine, db = obs2ebird.db_conn()
+            timed('sqlite to_sql', n, lambda: to_sql(d, db, sqlEngine))
+            timed('sqlite bulk_load', n, lambda: obs2ebird.bulk_load(d, db, sqlEngine))
+            sqlEngine.close()
+
+    if '--mysql' in sys.argv:
+        config = get_config()
+        for local_infile in (False, True):
+            config = {**config, 'default': {'db_dialect': 'mysql'},
+                      'mysql': {**config['mysql'], 'local_infile': local_infile}}
+            with obs2ebird.use_config(config):
+                sqlEngine, db = obs2ebird.db_conn()
+                if not local_infile:
+                    timed('mysql to_sql', n, lambda: to_sql(d, db, sqlEngine))
+                label = 'mysql bulk_load (load data infile)' if local_infile else 'mysql bulk_load (inserts)'
+                timed(label, n, lambda: obs2ebird.bulk_load(d, db, sqlEngine))
+
+
+if __name__ == "__main__":
+    main()
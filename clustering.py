@@ -0,0 +1,120 @@
+"""
+"   Spatial clustering of observation points into checklist locations
+"
+"   Points closer than a radius are linked (single linkage). The points are hashed in a grid of cells whose
+"   diagonal is the radius: the points of a cell are always linked, and only the neighbouring cells need to be
+"   compared, which keeps the clustering close to linear in the number of points.
+"
+"""
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS = 6371000.0
+# offsets of the cells which may hold points closer than the radius, for a cell diagonal equal to the radius.
+# Only the cells after the current one are listed, so that each pair of cells is compared once.
+NEIGHBOURS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)
+              if (dx, dy) > (0, 0) and max(abs(dx) - 1, 0) ** 2 + max(abs(dy) - 1, 0) ** 2 < 2]
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_points(lat, lng, radius):
+    """
+    Clusters points closer than a given distance.
+
+    :param lat: numpy array of latitudes, in degrees.
+    :param lng: numpy array of longitudes, in degrees.
+    :param radius: The maximum distance between linked points, in meters.
+    :return: numpy array with the cluster number of each point, -1 for points without coordinates.
+    """
+    n = len(lat)
+    labels = np.full(n, -1, dtype=np.int64)
+    valid = ~(np.isnan(lat) | np.isnan(lng))
+    if not valid.any():
+        return labels
+    # local equirectangular projection, in meters
+    y = np.radians(lat) * EARTH_RADIUS
+    x = np.radians(lng) * EARTH_RADIUS * np.cos(np.radians(np.nanmean(lat)))
+    size = radius / np.sqrt(2)
+    cells = {}
+    for i in np.flatnonzero(valid):
+        cells.setdefault((int(x[i] // size), int(y[i] // size)), []).append(i)
+
+    # the points of a cell form one cluster, represented by the cell
+    keys = list(cells)
+    position = {key: k for k, key in enumerate(keys)}
+    parent = list(range(len(keys)))
+    points = {key: (x[ids], y[ids]) for key, ids in cells.items()}
+    r2 = radius * radius
+    for k, (cx, cy) in enumerate(keys):
+        px, py = points[(cx, cy)]
+        for dx, dy in NEIGHBOURS:
+            other = position.get((cx + dx, cy + dy))
+            if other is None:
+                continue
+            a, b = _find(parent, k), _find(parent, other)
+            if a == b:
+                continue
+            qx, qy = points[keys[other]]
+            if len(px) == 1 and len(qx) == 1:
+                linked = (px[0] - qx[0]) ** 2 + (py[0] - qy[0]) ** 2 <= r2
+            else:
+                linked = ((px[:, None] - qx[None, :]) ** 2 + (py[:, None] - qy[None, :]) ** 2 <= r2).any()
+            if linked:
+                parent[b] = a
+    for k, key in enumerate(keys):
+        labels[cells[key]] = _find(parent, k)
+    return labels
+
+
+def _attach(names, labels, missing):
+    """
+    :return: The labels of the points without coordinates: the cluster of the same name holding most located
+             points, else a new cluster per name, numbered after the `len(labels)` possible clusters.
+    """
+    located = pd.DataFrame({'location': names[~missing], 'label': labels[~missing]})
+    counts = located.value_counts(sort=False).reset_index(name='n')
+    best = counts.sort_values('n', ascending=False, kind='stable').drop_duplicates('location')
+    attached = pd.Series(names[missing]).map(best.set_index('location')['label']).to_numpy(dtype=float)
+    separate = len(labels) + pd.factorize(names[missing])[0]
+    return np.where(np.isnan(attached), separate, attached).astype(np.int64)
+
+
+def cluster_locations(df, radius):
+    """
+    Replaces the location of observations by the cluster of their coordinates, per day.
+
+    Each cluster is named after its most frequent location name. Observations without coordinates join the cluster
+    of the same day holding most of the located observations with the same location name, or else keep their
+    location. Names used by several clusters of a day are numbered.
+
+    :param df: A DataFrame with 'date', 'location', 'lat' and 'lng' columns.
+    :param radius: The clustering distance, in meters.
+    :return: A categorical Series with the location of each observation.
+    """
+    labels = np.empty(len(df), dtype=np.int64)
+    lat = df['lat'].to_numpy(dtype=float)
+    lng = df['lng'].to_numpy(dtype=float)
+    locations = df['location'].astype(str).to_numpy()
+    offset = 0
+    for _, idx in df.groupby('date', observed=True, sort=False).indices.items():
+        day = cluster_points(lat[idx], lng[idx], radius)
+        missing = day < 0
+        if missing.any():
+            day[missing] = _attach(locations[idx], day, missing)
+        labels[idx] = offset + day
+        offset += 2 * len(idx)
+
+    clusters = pd.DataFrame({'date': df['date'].astype(str).to_numpy(), 'label': labels, 'location': locations})
+    names = clusters.groupby(['date', 'label'], sort=False)['location'].agg(lambda s: s.value_counts().index[0])
+    names = names.reset_index()
+    rank = names.groupby(['date', 'location']).cumcount()
+    numbered = names['location'].str.rstrip() + ' (' + (rank + 1).astype(str) + ')'
+    names['location'] = names['location'].where(rank == 0, numbered)
+    named = clusters[['date', 'label']].merge(names, on=['date', 'label'], how='left')
+    return pd.Series(pd.Categorical(named['location'].to_numpy()), index=df.index)
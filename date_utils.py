@@ -0,0 +1,75 @@
+"""
+"   Date and time helpers working on whole columns of fixed-width ISO strings
+"
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+def is_iso_date(my_date):
+    """
+    Validates a date string.
+
+    :param my_date: The date to validate.
+    :return: True if the date is a valid date in the format YYYY-MM-DD, False otherwise.
+    """
+    if len(my_date) != 10 or my_date[4] != '-' or my_date[7] != '-':
+        return False
+    _year, _mm, _dd = my_date[:4], my_date[5:7], my_date[8:]
+    if not (_year.isdigit() and _mm.isdigit() and _dd.isdigit()):
+        return False
+    try:
+        date(int(_year), int(_mm), int(_dd))
+        return True
+    except ValueError:
+        return False
+
+
+def to_ebird_dates(dates):
+    """
+    Converts ISO dates to the eBird MM/DD/YYYY format.
+
+    :param dates: A Pandas Series of YYYY-MM-DD strings. For a categorical Series, only the
+                  categories are converted.
+    :return: A Series of MM/DD/YYYY strings, categorical if the input is.
+    """
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        return dates.cat.rename_categories(to_ebird_dates(dates.cat.categories.to_series()).to_numpy())
+    dates = dates.astype(str)
+    return dates.str[5:7] + '/' + dates.str[8:10] + '/' + dates.str[:4]
+
+
+def to_minutes(times):
+    """
+    Converts H:MM[:SS] time strings to a number of minutes since midnight.
+
+    Zero-padded HH:MM[:SS] columns, the observation.org format, are converted with integer arithmetic
+    on the characters; other columns are split on ':'.
+
+    :param times: A Pandas Series of time strings. Seconds are truncated.
+    :return: A Series of float32 whole minutes, NaN for missing or unparsable values.
+    """
+    if len(times) == 0:
+        return pd.Series(index=times.index, dtype='float32')
+    chars = times.to_numpy(dtype='S5').view(np.uint8).reshape(-1, 5).astype(np.int16) - ord('0')
+    digits = chars[:, [0, 1, 3, 4]]
+    if (chars[:, 2] == ord(':') - ord('0')).all() and ((digits >= 0) & (digits <= 9)).all():
+        minutes = (digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 2] * 10 + digits[:, 3]
+        return pd.Series(minutes, index=times.index, dtype='float32')
+    parts = times.astype(str).str.split(':', n=2, expand=True)
+    if 1 not in parts:
+        return pd.Series(np.nan, index=times.index, dtype='float32')
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    valid = hours.between(0, 23) & minutes.between(0, 59)
+    return (hours * 60 + minutes).where(valid).astype('float32')
+
+
+def format_time(minutes):
+    """
+    :param minutes: Number of minutes since midnight.
+    :return: The time formatted as HH:MM.
+    """
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
@@ -0,0 +1,85 @@
+"""
+"   Size-bounded cache of the generated eBird files
+"
+"   Files are stored by key, a hash of everything the export depends on (see obs2ebird.export_cache_key).
+"   The least recently used files are evicted when the cache exceeds its maximum size.
+"
+"""
+import shutil
+from stat import S_ISDIR
+from os import getenv, listdir, makedirs, remove, stat, utime
+from os.path import exists, join
+
+DEFAULT_DIR = join(getenv('HOME', '.'), '.cache', 'o2eb')
+DEFAULT_MAX_SIZE_MB = 200
+# suffix of the cached unmapped names report, see obs2ebird.write_unmapped_report
+REPORT = '_unmapped.csv'
+
+
+class ExportCache:
+    """
+    :param directory: The cache directory.
+    :param max_size_mb: The maximum total size of the cached files, in MB. 0 disables the cache.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.directory = directory
+        self.max_size = float(max_size_mb) * 1024 * 1024
+
+    def path(self, key):
+        return join(self.directory, f'{key}.csv')
+
+    def get(self, key, output_file, report_file=None):
+        """
+        Copies a cached file to the output file.
+
+        :param key: The cache key.
+        :param output_file: The path of the eBird file to write.
+        :param report_file: The path of the unmapped names report to write, if cached with the file.
+        :return: True if the file was cached, False otherwise.
+        """
+        if not self.max_size or not exists(self.path(key)):
+            return False
+        shutil.copyfile(self.path(key), output_file)
+        utime(self.path(key))
+        if report_file is not None and exists(join(self.directory, key + REPORT)):
+            shutil.copyfile(join(self.directory, key + REPORT), report_file)
+            utime(join(self.directory, key + REPORT))
+        return True
+
+    def put(self, key, output_file, report_file=None):
+        """
+        Stores a generated file, then evicts the least recently used files above the maximum size.
+
+        :param key: The cache key.
+        :param output_file: The path of the generated eBird file.
+        :param report_file: The path of its unmapped names report, if any.
+        :return: None
+        """
+        if not self.max_size:
+            return
+        makedirs(self.directory, exist_ok=True)
+        shutil.copyfile(output_file, self.path(key))
+        if report_file is not None and exists(report_file):
+            shutil.copyfile(report_file, join(self.directory, key + REPORT))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits in its maximum size.
+
+        :return: None
+        """
+        files = []
+        for name in listdir(self.directory):
+            st = stat(join(self.directory, name))
+            # e.g. the GUI image cache, see image_cache.py
+            if S_ISDIR(st.st_mode):
+                continue
+            files.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_size:
+                break
+            remove(join(self.directory, name))
+            total -= size
@@ -0,0 +1,262 @@
+"""
+"   Reverse geocoding providers
+"
+"   Each provider has its own pooled HTTP session, rate limit and timeout, and can be shared by several threads.
+"   The providers listed in the `geocoders` section of the config are tried in order, e.g. a local Nominatim
+"   server first and the public one as fallback:
+"
+"   geocoders:
+"     - type: nominatim
+"       url: http://localhost:8080
+"       rate_limit: 0
+"     - type: nominatim
+"       url: https://nominatim.openstreetmap.org
+"       rate_limit: 1
+"       timeout: 10
+"
+"   Without network, or in tests, the `places` provider answers offline from a CSV file of known places (lat, lng,
+"   state and country columns), e.g. the places of earlier checklists:
+"
+"   geocoders:
+"     - type: places
+"       file: places.csv
+"       max_distance: 25
+"
+"   The same file can be served as a local HTTP stand-in for Nominatim, used with `type: nominatim` and
+"   `url: http://localhost:8080`:
+"
+"   python geocoders.py places.csv --port 8080
+"
+"""
+import argparse
+import json
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from geopy.exc import GeopyError
+
+USER_AGENT = 'obs2ebird'
+# public Nominatim server, used when no geocoder is configured. Its usage policy allows 1 request per second.
+DEFAULT_GEOCODERS = [{'type': 'nominatim', 'url': 'https://nominatim.openstreetmap.org', 'rate_limit': 1}]
+EARTH_RADIUS_KM = 6371.0
+
+
+class GeocodingError(GeopyError):
+    """
+    Raised when no provider could geocode a location.
+    """
+
+
+class Provider(ABC):
+    """
+    Base class of the HTTP geocoding providers.
+
+    :param url: The base URL of the service.
+    :param rate_limit: The maximum number of requests per second, 0 for no limit.
+    :param timeout: The request timeout, in seconds.
+    :param pool_size: The number of pooled HTTP connections.
+    """
+
+    def __init__(self, url, rate_limit=0, timeout=10, pool_size=10):
+        self.url = url.rstrip('/')
+        self.interval = 1 / float(rate_limit) if rate_limit else 0
+        self.timeout = float(timeout)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """
+        Waits for the next request slot allowed by the rate limit.
+
+        :return: None
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def get(self, path, params):
+        """
+        :param path: The path of the request, relative to the provider URL.
+        :param params: The query parameters.
+        :return: The decoded JSON response.
+        """
+        self.wait()
+        resp = self.session.get(f'{self.url}/{path}', params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    @abstractmethod
+    def reverse(self, lat, lon):
+        """
+        :param lat: float representing the latitude of the location
+        :param lon: float representing the longitude of the location
+        :return: dictionary containing the state and country information of the given location
+        """
+
+    def close(self):
+        self.session.close()
+
+
+class NominatimProvider(Provider):
+    """
+    Nominatim reverse geocoding, either the public server or a local instance.
+    """
+
+    def reverse(self, lat, lon):
+        location = self.get('reverse', {'lat': lat, 'lon': lon, 'format': 'jsonv2', 'addressdetails': 1})
+        address = location['address']
+        code = [c for c in address.keys() if 'ISO3166' in c][0]
+        return {'state': address[code].split('-')[1], 'country': address['country_code'].upper()}
+
+
+class PlacesProvider:
+    """
+    Offline provider answering with the nearest place of a CSV file with lat, lng, state and country columns.
+
+    :param file: The path of the places file.
+    :param max_distance: The maximum distance to a place, in km. Farther locations are not geocoded.
+    """
+    url = 'places'
+
+    def __init__(self, file, max_distance=25):
+        df = pd.read_csv(file, dtype={'state': str, 'country': str}, encoding='UTF_8')
+        self.url = file
+        self.coords = np.radians(df[['lat', 'lng']].to_numpy(dtype=float))
+        self.places = [{'state': st, 'country': co} for st, co in zip(df['state'], df['country'])]
+        self.max_distance = float(max_distance)
+
+    def reverse(self, lat, lon):
+        if len(self.places) == 0:
+            raise LookupError('No places')
+        lat, lon = np.radians(float(lat)), np.radians(float(lon))
+        # haversine distance to every place, in km
+        h = np.sin((self.coords[:, 0] - lat) / 2) ** 2 + \
+            np.cos(lat) * np.cos(self.coords[:, 0]) * np.sin((self.coords[:, 1] - lon) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+        i = int(np.argmin(km))
+        if km[i] > self.max_distance:
+            raise LookupError(f'No place within {self.max_distance} km')
+        return dict(self.places[i])
+
+    def close(self):
+        pass
+
+
+PROVIDERS = {'nominatim': NominatimProvider, 'places': PlacesProvider}
+
+
+class Geocoder:
+    """
+    Tries an ordered list of providers until one answers.
+
+    :param providers: A list of Provider instances.
+    """
+
+    def __init__(self, providers):
+        self.providers = providers
+
+    def reverse(self, lat, lon):
+        """
+        :param lat: float representing the latitude of the location
+        :param lon: float representing the longitude of the location
+        :return: dictionary containing the state and country information of the given location
+        """
+        errors = []
+        for provider in self.providers:
+            try:
+                return provider.reverse(lat, lon)
+            except (requests.RequestException, ValueError, KeyError, IndexError, LookupError) as e:
+                errors.append(f'{provider.url}: {e!r}')
+        raise GeocodingError(f'Cannot geocode {lat},{lon}: ' + '; '.join(errors))
+
+    def close(self):
+        for provider in self.providers:
+            provider.close()
+
+
+def create_geocoder(settings=None):
+    """
+    :param settings: The list of provider settings of the config `geocoders` section, DEFAULT_GEOCODERS if None.
+    :return: A Geocoder trying the configured providers in order.
+    """
+    providers = []
+    for s in settings or DEFAULT_GEOCODERS:
+        s = dict(s)
+        kind = s.pop('type', 'nominatim')
+        if kind not in PROVIDERS:
+            raise ValueError(f'Unknown geocoder type "{kind}"')
+        providers.append(PROVIDERS[kind](**s))
+    return Geocoder(providers)
+
+
+def serve(places_file, port=8080, max_distance=25):
+    """
+    Serves the places of a file as a local stand-in for the Nominatim reverse geocoding API, answering
+    /reverse?lat=..&lon=.. with the address fields read by NominatimProvider.
+
+    :param places_file: The path of the places file, see `PlacesProvider`.
+    :param port: The HTTP port, on localhost.
+    :param max_distance: The maximum distance to a place, in km.
+    :return: None, runs until interrupted.
+    """
+    provider = PlacesProvider(places_file, max_distance)
+
+    class ReverseHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path.rstrip('/') != '/reverse':
+                    raise LookupError(f'Unknown path {url.path}')
+                place = provider.reverse(query['lat'], query['lon'])
+                code, body = 200, {'address': {'ISO3166-2-lvl4': f"{place['country']}-{place['state']}",
+                                               'country_code': place['country'].lower()}}
+            except (KeyError, ValueError, LookupError) as e:
+                # as Nominatim, which answers an error object when nothing is found
+                code, body = 200, {'error': str(e)}
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', int(port)), ReverseHandler)
+    print(f'Serving {places_file} on http://127.0.0.1:{port}/reverse')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Nominatim reverse geocoding API')
+    parser.add_argument('places', help='CSV file of places with lat, lng, state and country columns')
+    parser.add_argument('-p', '--port', type=int, default=8080, help='HTTP port, default 8080')
+    parser.add_argument('-d', '--max_distance', type=float, default=25, help='Maximum distance to a place, in km')
+    args = parser.parse_args()
+    serve(args.places, args.port, args.max_distance)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,99 @@
-from yaml import load, Loader, dump, Dumper
-from os import getenv, makedirs
+from os import getenv, makedirs, stat
 from os.path import join, exists
+from threading import RLock
+
+from yaml import load, dump
+try:
+    from yaml import CLoader as Loader, CDumper as Dumper
+except ImportError:
+    from yaml import Loader, Dumper
+
+# parsed config file, shared by all the modules and reloaded when the file changes
+_cache = {'config': None, 'stamp': None}
+_listeners = []
+_lock = RLock()
+
+
+def config_file_path():
+    """
+    :return: The path of the config file, ~/.config/o2eb.yml
+    """
+    directory = join(getenv('HOME'), '.config')
+    # create a default config file is not exists
+    if not exists(directory):
+        makedirs(directory)
+    return join(directory, 'o2eb.yml')
+
+
+def _file_stamp(config_file):
+    st = stat(config_file)
+    return st.st_mtime_ns, st.st_size
 
 
 def get_config():
     """
     Method to read and load the config file.
 
+    The parsed config is cached and only read again when the file modification time or size changes.
+    The functions registered with `on_config_change` are then called.
+
     :return: The loaded config object from the config file.
     """
     # read config file
-    directory = join(getenv('HOME'), '.config')
-    # create a default config file is not exists
-    if not exists(directory):
-        makedirs(directory)
-    config_file = join(directory, 'o2eb.yml')
-    if not exists(config_file):
-        _config = {
-            "sqlite": {"db": join(getenv('HOME'), "observations.sqlite")},
-            "mysql": {"db": "observations", "host": "localhost", "port": "3306"},
-            "default": {"db_dialect": "sqlite"}
-        }
-        dump(_config, open(config_file, 'w'), Dumper=Dumper)
-
-    try:
-        return load(open(config_file, 'r'), Loader=Loader)
-    except IOError:
-        print('Config file not found!')
-        return None
+    config_file = config_file_path()
+    with _lock:
+        if not exists(config_file):
+            _config = {
+                "sqlite": {"db": join(getenv('HOME'), "observations.sqlite")},
+                "mysql": {"db": "observations", "host": "localhost", "port": "3306"},
+                "default": {"db_dialect": "sqlite"}
+            }
+            with open(config_file, 'w') as f:
+                dump(_config, f, Dumper=Dumper)
+
+        try:
+            stamp = _file_stamp(config_file)
+            if stamp == _cache['stamp']:
+                return _cache['config']
+            with open(config_file, 'r') as f:
+                _config = load(f, Loader=Loader)
+        except IOError:
+            print('Config file not found!')
+            return None
+        changed = _cache['stamp'] is not None
+        _cache['config'], _cache['stamp'] = _config, stamp
+    if changed:
+        _notify(_config)
+    return _config
 
 
 def write_config_file(new_config):
-    directory = join(getenv('HOME'), '.config')
-    # create a default config file is not exists
-    if not exists(directory):
-        makedirs(directory)
-    config_file = join(directory, 'o2eb.yml')
-    dump(new_config, open(config_file, 'w'), Dumper=Dumper)
\ No newline at end of file
+    """
+    Writes the config file and makes the new config the current one.
+
+    :param new_config: The config dictionary to save.
+    :return: None
+    """
+    config_file = config_file_path()
+    with _lock:
+        with open(config_file, 'w') as f:
+            dump(new_config, f, Dumper=Dumper)
+        _cache['config'], _cache['stamp'] = new_config, _file_stamp(config_file)
+    _notify(new_config)
+
+
+def on_config_change(callback):
+    """
+    Registers a function called with the new config each time it changes, e.g. to drop connections or
+    caches built from the previous one.
+
+    :param callback: A function taking the new config as parameter.
+    :return: The callback, so that this can be used as a decorator.
+    """
+    _listeners.append(callback)
+    return callback
+
+
+def _notify(new_config):
+    for callback in list(_listeners):
+        callback(new_config)
@@ -0,0 +1,97 @@
+"""
+"   Cache of the scaled GUI images
+"
+"   Each image is decoded and scaled once per size. The scaled variants are also saved in ~/.cache/o2eb/images,
+"   keyed by the source modification time and the target size, so that the next starts of the GUI load them
+"   directly instead of scaling the full size source again.
+"
+"""
+from glob import glob
+from os import getenv, makedirs, remove, replace, stat
+from os.path import basename, exists, join, splitext
+from threading import Lock
+
+from PIL import Image
+
+CACHE_DIR = join(getenv('HOME', '.'), '.cache', 'o2eb', 'images')
+
+# scaled images by (path, mtime, size, keep_proportion), see load_image
+_images = {}
+_lock = Lock()
+
+
+def scaled_size(img_size, size, keep_proportion=True):
+    """
+    :param img_size: The (width, height) of the source image.
+    :param size: The desired (width, height). If empty, the source size is kept.
+    :param keep_proportion: If True, the height follows the width to keep the aspect ratio.
+    :return: The (width, height) of the scaled image.
+    """
+    if not size:
+        return tuple(img_size)
+    w, h = size
+    if keep_proportion:
+        return w, int(img_size[1] * w / img_size[0])
+    return w, h
+
+
+def cache_file(image_path, mtime, size, keep_proportion=True):
+    """
+    :return: The path of the scaled variant of an image in the disk cache.
+    """
+    stem, ext = splitext(basename(image_path))
+    w, h = size if size else (0, 0)
+    return join(CACHE_DIR, f"{stem}_{mtime}_{w}x{h}{'' if keep_proportion else 's'}{ext}")
+
+
+def load_image(image_path, size=tuple(), keep_proportion=True):
+    """
+    :param image_path: The path of the image file.
+    :param size: The desired size of the image as a tuple of width and height, see `scaled_size`.
+    :param keep_proportion: If True, the image aspect ratio is kept, see `scaled_size`.
+    :return: The scaled PIL image, shared by all the callers asking for the same size.
+    """
+    mtime = stat(image_path).st_mtime_ns
+    key = (image_path, mtime, tuple(size), keep_proportion)
+    with _lock:
+        if key in _images:
+            return _images[key]
+        cached = cache_file(image_path, mtime, size, keep_proportion)
+        if exists(cached):
+            _img = Image.open(cached)
+            _img.load()
+        else:
+            _img = _scale(image_path, size, keep_proportion)
+            _save(_img, image_path, cached)
+        _images[key] = _img
+        return _img
+
+
+def _scale(image_path, size, keep_proportion):
+    _img = Image.open(image_path)
+    target = scaled_size(_img.size, size, keep_proportion)
+    # JPEG images can be decoded directly at a reduced scale, much faster than decoding the full image
+    _img.draft(_img.mode, target)
+    if _img.size != target:
+        _img = _img.resize(target, Image.LANCZOS)
+    _img.load()
+    return _img
+
+
+def _save(_img, image_path, cached):
+    """
+    Saves a scaled image in the disk cache and removes the variants of previous versions of its source.
+    The cache is an optimization only: errors are ignored.
+    """
+    stem, ext = splitext(basename(image_path))
+    current = cached.rsplit('_', 1)[0] + '_'
+    try:
+        makedirs(CACHE_DIR, exist_ok=True)
+        for old in glob(join(CACHE_DIR, f'{stem}_[0-9]*{ext}')):
+            if not old.startswith(current):
+                remove(old)
+        # written aside then renamed, so that another GUI never reads a partial file
+        _img.save(f'{cached}.tmp', format=Image.registered_extensions()[ext.lower()], quality=95)
+        replace(f'{cached}.tmp', cached)
+    except (OSError, KeyError):
+        pass
@@ -0,0 +1,226 @@
+"""
+"   Batch of import and export jobs run in one process
+"
+"   The jobs are listed in a YAML file and run by a pool of workers, sharing the config, database connections,
+"   name mappings, geocoder and taxonomy caches. A job starts once the jobs it depends on are done: the jobs
+"   listed in its `after` key, and the earlier mappings jobs and imports of the same observer. Independent
+"   jobs, e.g. the exports of several date ranges or observers, run concurrently.
+"
+"   Example jobs.yml:
+"       workers: 4
+"       jobs:
+"         - name: mappings
+"           type: mappings
+"           file: mappings.csv
+"         - name: import jdoe
+"           type: import
+"           input: obs_data/jdoe_*.csv
+"           observer: jdoe
+"         - name: jdoe 2023
+"           type: export
+"           output: ebird_data/jdoe_2023.csv
+"           from: 2023-01-01
+"           to: 2023-12-31
+"           observer: jdoe
+"
+"   python obs2ebird.py --jobs jobs.yml --report report.json
+"
+"""
+import contextvars
+import json
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from threading import Lock
+
+from yaml import load
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+import obs2ebird
+
+JOB_TYPES = ('mappings', 'import', 'export', 'preview')
+DEFAULT_WORKERS = 4
+
+# sqlite allows a single writer: with sqlite, the imports of a batch are run one at a time
+_write_lock = Lock()
+
+
+def _writing():
+    return _write_lock if obs2ebird.is_sqlite() else nullcontext()
+
+
+def load_jobs(jobs_file):
+    """
+    :param jobs_file: The path of the YAML jobs file.
+    :return: A (jobs, workers) tuple: the list of job dictionaries, each with a unique 'name', and the
+             number of workers.
+    """
+    with open(jobs_file, 'r') as f:
+        spec = load(f, Loader=Loader) or {}
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    jobs = []
+    for i, job in enumerate(spec.get('jobs') or []):
+        job = dict(job)
+        job.setdefault('name', f"{job.get('type')} {i + 1}")
+        # same observer as the command line and the GUI when not given
+        job['observer'] = obs2ebird.default_observer(job.get('observer'))
+        if job.get('type') not in JOB_TYPES:
+            raise ValueError(f'Job "{job["name"]}": unknown type "{job.get("type")}"')
+        jobs.append(job)
+    if len({job['name'] for job in jobs}) != len(jobs):
+        raise ValueError('Job names must be unique')
+    return jobs, int(spec.get('workers', DEFAULT_WORKERS))
+
+
+def dependencies(jobs):
+    """
+    Lists the jobs each job waits for: the jobs named in its `after` key, the earlier mappings jobs and, for
+    the imports, exports and previews, the earlier imports of the same observer.
+
+    :param jobs: The jobs, see `load_jobs`.
+    :return: A {name: set of names} dictionary.
+    :raise ValueError: If a job depends on an unknown job, or on itself through a cycle.
+    """
+    names = {job['name'] for job in jobs}
+    deps = {}
+    for i, job in enumerate(jobs):
+        after = job.get('after') or []
+        after = {after} if isinstance(after, str) else set(after)
+        unknown = after - names
+        if unknown:
+            raise ValueError(f'Job "{job["name"]}" depends on unknown job(s) {sorted(unknown)}')
+        for prev in jobs[:i]:
+            if prev['type'] == 'mappings' or \
+                    (prev['type'] == 'import' and prev.get('observer') == job.get('observer')):
+                after.add(prev['name'])
+        deps[job['name']] = after
+
+    # topological sort, to reject cycles before running anything
+    done = set()
+    pending = dict(deps)
+    while pending:
+        ready = [name for name, after in pending.items() if after <= done]
+        if not ready:
+            raise ValueError(f'Cyclic job dependencies between {sorted(pending)}')
+        for name in ready:
+            done.add(name)
+            del pending[name]
+    return deps
+
+
+def run_job(job):
+    """
+    Runs one job.
+
+    :param job: A job dictionary, see `load_jobs`.
+    :return: None|str None if OK, else a status message.
+    """
+    kind = job['type']
+    observer = job.get('observer')
+    if kind == 'mappings':
+        with _writing():
+            return obs2ebird.import_mappings(job['file'])
+    if kind == 'import':
+        with _writing():
+            return obs2ebird.import_obs(job['input'], job.get('folder', '.'), observer)
+    start_date, end_date = _date(job.get('from')), _date(job.get('to'))
+    if kind == 'preview':
+        preview = obs2ebird.preview_export(start_date, end_date, observer)
+        if preview is None:
+            return 'Cannot query the database'
+        job['result'] = {x: preview[x] for x in ('checklists', 'species', 'observations')}
+        return None
+    return obs2ebird.export_to_ebird(job['output'], start_date, end_date, observer)
+
+
+def _date(value):
+    # YAML reads unquoted ISO dates as dates
+    return None if value is None else str(value)
+
+
+def _timed(job):
+    started = time.time()
+    t = time.perf_counter()
+    try:
+        status = run_job(job)
+    except Exception as e:
+        status = repr(e)
+    return {
+        'status': 'ok' if status is None else 'error',
+        'message': status,
+        'started': datetime.fromtimestamp(started).isoformat(timespec='milliseconds'),
+        'seconds': round(time.perf_counter() - t, 3)
+    }
+
+
+def run_jobs(jobs, workers=DEFAULT_WORKERS):
+    """
+    Runs a batch of jobs, each as soon as the jobs it depends on succeeded (see `dependencies`). The jobs
+    depending on a failed job are skipped.
+
+    :param jobs: The jobs, see `load_jobs`.
+    :param workers: The number of jobs run concurrently.
+    :return: The report, a list with a dictionary per job, in the jobs order: 'name', 'type', 'observer',
+             'status' (ok, error or skipped), 'message', 'started' and 'seconds'.
+    """
+    deps = dependencies(jobs)
+    by_name = {job['name']: job for job in jobs}
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while len(results) < len(jobs):
+            for name, after in deps.items():
+                if name in results or name in running.values():
+                    continue
+                failed = sorted(x for x in after if results.get(x, {}).get('status') in ('error', 'skipped'))
+                if failed:
+                    results[name] = {'status': 'skipped', 'message': f'Depends on failed job(s) {failed}',
+                                     'started': None, 'seconds': 0}
+                elif all(x in results for x in after):
+                    # each job runs in a copy of the current context, e.g. to keep a `use_config` override
+                    ctx = contextvars.copy_context()
+                    running[executor.submit(ctx.run, _timed, by_name[name])] = name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+
+    report = []
+    for job in jobs:
+        entry = {'name': job['name'], 'type': job['type'], 'observer': job.get('observer')}
+        entry.update(results[job['name']])
+        if 'result' in job:
+            entry['result'] = job['result']
+        report.append(entry)
+    return report
+
+
+def run_jobs_file(jobs_file, report_file=None):
+    """
+    Runs the jobs of a YAML file and writes the JSON timing report.
+
+    :param jobs_file: The path of the YAML jobs file, see `load_jobs`.
+    :param report_file: The path of the JSON report. If None, the report is printed.
+    :return: None|str None if all the jobs succeeded, else a status message.
+    """
+    try:
+        jobs, workers = load_jobs(jobs_file)
+        t = time.perf_counter()
+        report = run_jobs(jobs, workers)
+    except (OSError, ValueError, KeyError) as e:
+        return str(e)
+    report = {'jobs': report, 'seconds': round(time.perf_counter() - t, 3)}
+    if report_file is None:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    failed = [entry['name'] for entry in report['jobs'] if entry['status'] != 'ok']
+    if failed:
+        return f'{len(failed)} job(s) failed or skipped: {", ".join(failed)}'
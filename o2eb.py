@@ -6,22 +6,23 @@
 "
 "
 """
-import re
 import tkinter as tk
 from tkinter import filedialog as fd
 from tkinter.messagebox import showinfo
 from tkinter import ttk
-from PIL import ImageTk, Image
+from PIL import ImageTk
 from os.path import dirname, basename, join, abspath
 from os import getcwd, getenv
-from obs2ebird import import_obs, export_to_ebird
-from datetime import date
+from obs2ebird import import_obs, export_to_ebird, preview_export
 from get_config import get_config, write_config_file
-
-config = get_config()
+from date_utils import is_iso_date
+from image_cache import load_image
 
 __dir__ = dirname(__file__)
 
+# PhotoImage by (path, size, keep_proportion), shared by all the widgets, see O2ebGui.get_image
+_photos = {}
+
 
 class O2ebGui(tk.Tk):
     """
@@ -56,6 +57,11 @@ class O2ebGui(tk.Tk):
         self.file_folder = None
         self.inp = None
         self.lbl_export_status = None
+        self.preview_status = None
+        self.lbl_preview = None
+        self.preview_job = None
+        self.observer = None
+        self.observer_inp = None
         self.file_names = None
         self.lbl_list = None
         self.lbl_img = None
@@ -95,13 +101,16 @@ class O2ebGui(tk.Tk):
         self.mysql_host = tk.StringVar()
         self.mysql_port = tk.StringVar()
         self.choice = tk.StringVar()
+        self.observer = tk.StringVar()
 
     def init_config(self):
+        config = get_config()
         self.sqlite_db = config['sqlite']['db']
         self.mysql_db = config['mysql']['db']
         self.mysql_host.set(config['mysql']['host'])
         self.mysql_port.set(config['mysql']['port'])
         self.choice.set(config['default']['db_dialect'])
+        self.observer.set(config['default'].get('observer') or '')
 
     def init_ui(self):
         self.title("Observation to eBird list conversion")
@@ -132,6 +141,14 @@ class O2ebGui(tk.Tk):
                                   foreground='green')
         self.lbl_list.grid(column=0, row=row, sticky=tk.W, padx=50, pady=10)
 
+        # observer whose observations are imported and exported, empty if the database has a single observer
+        frm_observer = ttk.Frame(self.frm)
+        frm_observer.grid(column=0, row=row, sticky=tk.E)
+        ttk.Label(frm_observer, text="Observer", foreground='green').grid(column=0, row=0, padx=5)
+        self.observer_inp = ttk.Entry(frm_observer, textvariable=self.observer, justify=tk.LEFT, width=15)
+        self.observer_inp.grid(column=1, row=0)
+        self.observer.trace_add('write', self.dates_changed_event)
+
         row += 1
         # define an input field to capture observation file to import
         # val = self.register(self.check_files_exist)
@@ -158,7 +175,6 @@ class O2ebGui(tk.Tk):
         self.file_folder.set(f"Current folder: {abspath(getcwd())}")
         self.lbl_folder = ttk.Label(self.frm, textvariable=self.file_folder)
         self.lbl_folder.grid(column=0, row=row, sticky=tk.W, padx=50, pady=0)
-        _img = self.get_image('./images/folder.png', (30, 30), True)
 
         # create a processing button
         self.btn_upload = ttk.Button(self.frm,
@@ -236,6 +252,8 @@ class O2ebGui(tk.Tk):
                                 validatecommand=val, validate='focusout', invalidcommand=inval)
         self.to_inp.grid(column=0, row=row, sticky=tk.W, padx=170, pady=0)
         self.to_inp.update()
+        self.from_date.trace_add('write', self.dates_changed_event)
+        self.to_date.trace_add('write', self.dates_changed_event)
 
         # create a processing button
         self.btn_export = ttk.Button(self.frm,
@@ -251,6 +269,13 @@ class O2ebGui(tk.Tk):
         self.lbl_export_status = ttk.Label(self.frm, textvariable=self.export_status, style='Status.TLabel')
         self.lbl_export_status.grid(column=0, row=row, sticky=tk.E, padx=0, pady=0)
 
+        # live preview of the export content for the selected dates
+        self.preview_status = tk.StringVar()
+        self.preview_status.set('')
+        self.lbl_preview = ttk.Label(self.frm, textvariable=self.preview_status)
+        self.lbl_preview.grid(column=0, row=row, sticky=tk.W, padx=50, pady=0)
+        self.dates_changed_event()
+
     def create_frame(self):
         """
         Create a frame for the O2ebGui class.
@@ -295,6 +320,7 @@ class O2ebGui(tk.Tk):
 
         default:
           db_dialect: [mysql | sqlite]
+          observer: xxx
 
         :return: None
         """
@@ -341,6 +367,7 @@ class O2ebGui(tk.Tk):
         self.in_port = ttk.Entry(self.top, textvariable=self.mysql_port, justify=tk.LEFT, width=15)
         self.in_port.grid(row=row, sticky=tk.W, padx=20 + self.lbl_port.winfo_width())
 
+        config = get_config()
         if config['default']['db_dialect'] == 'sqlite':
             self.dbname.set(self.sqlite_db)
             rb_sqlite.invoke()
@@ -373,12 +400,13 @@ class O2ebGui(tk.Tk):
         Default is True.
         :return: An ImageTk.PhotoImage instance representing the resized image.
 
+        The image is scaled once per size (see `load_image`) and the same PhotoImage is returned to all the
+        widgets and popups asking for it.
         """
-        _img = Image.open(join(__dir__, image_path))
-        w, h = size
-        factor = w / _img.width if keep_proportion else 1
-        _img = _img.resize((w, int(_img.height * factor)), Image.LANCZOS)
-        return ImageTk.PhotoImage(_img)
+        key = (image_path, tuple(size), keep_proportion)
+        if key not in _photos:
+            _photos[key] = ImageTk.PhotoImage(load_image(join(__dir__, image_path), size, keep_proportion))
+        return _photos[key]
 
     def set_dbname_event(self, event):
         """
@@ -399,18 +427,15 @@ class O2ebGui(tk.Tk):
 
         :return: None
         """
-        global config
-        _config = {
-            "mysql": {
-                "host": self.mysql_host.get(),
-                "port": self.mysql_port.get(),
-                "db": self.mysql_db
-            },
-            "sqlite": {"db": self.sqlite_db},
-            "default": {"db_dialect": self.db.get()}
-        }
+        # only the settings edited here are changed, the other config sections and keys are kept
+        _config = dict(get_config())
+        _config['mysql'] = {**_config.get('mysql', {}), "host": self.mysql_host.get(),
+                            "port": self.mysql_port.get(), "db": self.mysql_db}
+        _config['sqlite'] = {**_config.get('sqlite', {}), "db": self.sqlite_db}
+        _config['default'] = {**_config.get('default', {}), "db_dialect": self.db.get(),
+                              "observer": self.observer.get()}
         write_config_file(_config)
-        config = _config.copy()
+        config = get_config()
         self.sqlite_db = config['sqlite']['db']
         self.mysql_db = config['mysql']['db']
         self.mysql_host.set(config['mysql']['host'])
@@ -444,15 +469,37 @@ class O2ebGui(tk.Tk):
         :param my_date: The date to validate.
         :return: True if the date is a valid format (YYYY-MM-DD), False otherwise.
         """
-        matches = re.findall(r'(\d{4})-(\d{2})-(\d{2})', my_date, re.DOTALL)
-        if len(matches) != 0:
-            _year, _mm, _dd = matches[0]
-            try:
-                date(int(_year), int(_mm), int(_dd))
-                return True
-            except TypeError:
-                return False
-        return False
+        return is_iso_date(my_date)
+
+    def dates_changed_event(self, *args):
+        """
+        Schedules the refresh of the export preview, once the dates have not changed for 300 ms.
+
+        :param args: The variable trace arguments, unused.
+        :return: None
+        """
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+        self.preview_job = self.after(300, self.update_preview)
+
+    def update_preview(self):
+        """
+        Displays the number of checklists, species and observations between the from and to dates.
+
+        :return: None
+        """
+        self.preview_job = None
+        _from = self.from_date.get()
+        _to = self.to_date.get()
+        if not is_iso_date(_from) or (_to != '' and not is_iso_date(_to)):
+            self.preview_status.set('')
+            return
+        preview = preview_export(_from, None if _to == '' else _to, self.observer.get())
+        if preview is None:
+            self.preview_status.set('')
+        else:
+            self.preview_status.set(f"{preview['checklists']} checklists, {preview['species']} species, "
+                                    f"{preview['observations']} observations")
 
     @staticmethod
     def invalid_date_event():
@@ -512,8 +559,9 @@ class O2ebGui(tk.Tk):
         _folder = self.file_folder.get()
         if ':' in _folder:
             _folder = _folder.split(":")[1].strip()
-        status = import_obs(self.inp.get(), folder=_folder)
+        status = import_obs(self.inp.get(), folder=_folder, observer=self.observer.get())
         self.upload_status.set('File(s) processed' if status is None else f'Error: {status}')
+        self.dates_changed_event()
 
     def export_event(self):
         """
@@ -542,7 +590,7 @@ class O2ebGui(tk.Tk):
         _to = self.to_inp.get()
         if _to == '':
             _to = None
-        status = export_to_ebird(_file, _from, _to)
+        status = export_to_ebird(_file, _from, _to, self.observer.get())
         self.export_status.set('File processed' if status is None else f'Error: {status}')
         return status
 
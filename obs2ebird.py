@@ -1,37 +1,132 @@
 import pandas as pd
+import numpy as np
 import sqlalchemy.exc
 from sqlalchemy import create_engine
 
 import warnings
 
 from glob import glob
-from os.path import basename, dirname, join
+from os import remove, replace
+from os.path import basename, dirname, exists, join, splitext
 
 import argparse
-import re
-from geopy.geocoders import Nominatim, options
+from contextlib import contextmanager
+from contextvars import ContextVar
 from geopy import distance
-import certifi
-import ssl
-import datetime
+from geopy.exc import GeopyError
 import csv
+import hashlib
+import json
+import re
 import sqlite3
-
-from get_config import get_config
-
-config = get_config()
+import tempfile
+import time
+from threading import Lock
+
+from get_config import get_config, on_config_change
+from date_utils import to_ebird_dates, to_minutes, format_time
+from clustering import cluster_locations, EARTH_RADIUS
+from geocoders import create_geocoder
+from export_cache import ExportCache, DEFAULT_DIR as DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB as DEFAULT_CACHE_SIZE_MB
+
+# config of the current conversion, see use_config
+_active_config = ContextVar('o2eb_config', default=None)
+# MySQL engines (connection pools) by (host, port, db, local_infile), dropped when the config changes
+_engines = {}
+_engines_lock = Lock()
+# name mappings by db_key(), see load_mappings
+_mappings = {}
+# geocoders by config `geocoders` section, see get_geocoder
+_geocoders = {}
+_geocoders_lock = Lock()
 error = None
 
 __dir__ = dirname(__file__)
 
-ctx = ssl.create_default_context(cafile=certifi.where())
-options.default_ssl_context = ctx
-options.default_user_agent = 'obs2ebird'
-geolocator = Nominatim(scheme='http')
 args = None
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+# materialized per checklist summary, maintained by import_obs
+CHECKLISTS = 'checklists'
+CHECKLIST_COLUMNS = ['date', 'location', 'start_time', 'duration', 'lat', 'lng', 'distance', 'protocol',
+                     'state', 'country']
+# table of the species and location names mapping to the eBird names
+MAPPINGS = 'name_mappings'
+MAPPING_KINDS = ('species', 'location')
+# minimum score of a taxonomy match to be saved as species mapping, see resolve_species
+DEFAULT_MIN_SCORE = 0.85
+# rows of the eBird file header, one column per checklist
+HEADER_FIELDS = ['Location', 'Latitude', 'Longitude', 'Date', 'Start Time', 'State', 'Country', 'Protocol',
+                 'Num Observers', 'Duration (min)', 'All Obs Reported (Y/N)', 'Dist Traveled (Miles)',
+                 'Area Covered (Acres)', 'Notes']
+# per date content hash and version of the observations, see update_data_versions
+DATA_VERSIONS = 'data_versions'
+# part of the export cache key, to be changed with the eBird file layout
+CACHE_FORMAT = 1
+# number of observations fetched at once by the export
+CHUNKSIZE = 10000
+# number of rows inserted per executemany call by the import, see bulk_load
+BULK_BATCH = 5000
+# attempts per checklist and delay increment (seconds) between them, see enrich_checklists
+RETRIES = 3
+RETRY_DELAY = 2
+
+
+def active_config():
+    """
+    :return: The config set by `use_config` for the current thread or task, else the config file content.
+    """
+    _config = _active_config.get()
+    return get_config() if _config is None else _config
+
+
+@contextmanager
+def use_config(_config):
+    """
+    Context manager using the given config instead of the config file, for the current thread or task
+    only. This allows conversions with different configs to run concurrently.
+
+    :param _config: A config dictionary, as returned by `get_config`.
+    """
+    token = _active_config.set(_config)
+    try:
+        yield _config
+    finally:
+        _active_config.reset(token)
+
+
+def is_sqlite():
+    """
+    :return: True if the active config uses a sqlite database.
+    """
+    return active_config()['default']['db_dialect'] == 'sqlite'
+
+
+@on_config_change
+def dispose_engines(_config=None):
+    """
+    Closes the pooled MySQL and geocoding connections and drops the cached name mappings, e.g. because the
+    config has changed.
+
+    :param _config: The new config, unused.
+    :return: None
+    """
+    with _engines_lock:
+        while _engines:
+            _engines.popitem()[1].dispose()
+    _mappings.clear()
+    with _geocoders_lock:
+        while _geocoders:
+            _geocoders.popitem()[1].close()
+
+
+def clustering_radius():
+    """
+    :return: The location clustering distance in meters of the active config, None if not configured.
+    """
+    return (active_config().get('clustering') or {}).get('radius')
+
 
 def db_conn():
     """
@@ -40,6 +135,7 @@ def db_conn():
     :return: A SQLAlchemy engine connected to the MySQL database.
     """
     db = None
+    config = active_config()
 
     if config['default']['db_dialect'] == 'sqlite':
         try:
@@ -50,12 +146,19 @@ def db_conn():
             return None, None
     else:
         try:
-            from get_secrets import get_secret
-            user, pwd = get_secret('comptes')
             host = config['mysql']['host']
             port = config['mysql']['port']
             db = config['mysql']['db']
-            return create_engine(f'mysql+pymysql://{user}:{pwd}@{host}:{port}/{db}', pool_recycle=3600), db
+            local_infile = bool(config['mysql'].get('local_infile', False))
+            key = (host, port, db, local_infile)
+            # one engine per database, even when several threads connect for the first time at once
+            with _engines_lock:
+                if key not in _engines:
+                    from get_secrets import get_secret
+                    user, pwd = get_secret('comptes')
+                    _engines[key] = create_engine(f'mysql+pymysql://{user}:{pwd}@{host}:{port}/{db}',
+                                                  pool_recycle=3600, connect_args={'local_infile': local_infile})
+                return _engines[key], db
         except IOError:
             print('Cannot open secrets file')
             return None, None
@@ -66,7 +169,51 @@ def db_conn():
             return None, None
 
 
-def import_obs(input_file, folder='.'):
+def db_key():
+    """
+    :return: A key identifying the database of the active config, for the in-memory caches.
+    """
+    config = active_config()
+    dialect = config['default']['db_dialect']
+    if dialect == 'sqlite':
+        return dialect, config['sqlite']['db']
+    return dialect, config['mysql']['host'], config['mysql']['port'], config['mysql']['db']
+
+
+def observer_tables(db, observer=None):
+    """
+    Names the tables of an observer.
+
+    Each observer has their own observations, checklists and data versions tables, so that the members of a
+    shared database can import and export concurrently without locking or scanning each other's rows. The name
+    mappings are shared by all observers.
+
+    :param db: The database name returned by `db_conn`, which names the observations table.
+    :param observer: The observer name, used as is in the table names: lowercase letters and digits, possibly
+                     separated by single underscores. If None or empty, the tables of the database without observer.
+    :return: A dictionary with the 'observations', 'checklists' and 'versions' table names.
+    :raise ValueError: If the observer name is not valid. Names are not normalized, so that two different names,
+                       e.g. "J. Doe" and "j-doe", can never share the same tables.
+    """
+    if not observer:
+        return {'observations': db, 'checklists': CHECKLISTS, 'versions': DATA_VERSIONS}
+    key = str(observer).strip()
+    if not re.fullmatch(r'[a-z0-9]+(_[a-z0-9]+)*', key):
+        suggestion = re.sub(r'[^a-z0-9]+', '_', key.lower()).strip('_')
+        raise ValueError(f'Invalid observer name "{observer}": use lowercase letters, digits and underscores only'
+                         + (f', e.g. "{suggestion}"' if suggestion else ''))
+    return {'observations': f'{db}_{key}', 'checklists': f'{CHECKLISTS}_{key}', 'versions': f'{DATA_VERSIONS}_{key}'}
+
+
+def default_observer(observer=None):
+    """
+    :param observer: The observer given on the command line or in a jobs file, None if not given.
+    :return: The observer, else the observer of the `default` config section, as used by the GUI.
+    """
+    return observer if observer is not None else active_config()['default'].get('observer')
+
+
+def import_obs(input_file, folder='.', observer=None):
     """
     Import OBS Method
 
@@ -76,9 +223,23 @@ def import_obs(input_file, folder='.'):
                        Multiple files can be specified by separating them with commas.
                        Wildcards are allowed (unix style)
     :param folder:     file directory if not part of the input_file path
+    :param observer:   The observer whose observations are replaced, see `observer_tables`.
     :return: None|str  A status string is return in case of error
     """
-    # read input data
+    return save_observations(read_observations(input_file, folder), observer)
+
+
+def read_observations(input_file, folder='.'):
+    """
+    Reads observation.org files.
+
+    :param input_file: The path or paths to the input files, see `import_obs`.
+                       An open file object, e.g. an in-memory stream, is read as a single file.
+    :param folder:     file directory if not part of the input_file path
+    :return: A Pandas DataFrame with all the observations, as strings.
+    """
+    if not isinstance(input_file, str):
+        return pd.read_csv(input_file, delimiter=',', engine='python', encoding='UTF_8').fillna('')
     d = pd.DataFrame()
     for in_file in input_file.split(','):
         in_file = in_file.strip()
@@ -87,66 +248,300 @@ def import_obs(input_file, folder='.'):
         for f in glob(in_file):
             df = pd.read_csv(f, delimiter=',', engine='python', encoding='UTF_8').fillna('')
             d = pd.concat([d, df])
+    return d
+
 
-    # and save to mySQL db
+def save_observations(d, observer=None):
+    """
+    Saves observations into the SQL database, replacing the previous ones of the observer, and updates the
+    checklists table.
+
+    :param d: The observations, see `read_observations`.
+    :param observer: The observer whose observations are replaced, see `observer_tables`.
+    :return: None|str  A status string is return in case of error
+    """
+    if len(d.columns) == 0 or len(d) == 0:
+        # e.g. no file matching the input path: the stored observations are kept
+        return 'No observations to import, check the file name(s)'
     sqlEngine, db = db_conn()
     if db is None:
         return "Error in creating the database connection"
     try:
-        if config['default']['db_dialect'] == 'sqlite':
-            d.to_sql(name=db, con=sqlEngine, if_exists='replace')
-            sqlEngine.commit()
-        else:
-            with sqlEngine.begin() as cnx:
-                if 'local x' not in d:
-                    d['local x'] = ''
-                    d['local y'] = ''
-                d.to_sql(name=config['mysql']['db'], con=cnx, if_exists='replace')
+        tables = observer_tables(db, observer)
+    except ValueError as e:
+        return str(e)
+    try:
+        if not is_sqlite() and 'local x' not in d:
+            d['local x'] = ''
+            d['local y'] = ''
+        # the checklists are summarized (and geocoded) first, so that an error leaves the database unchanged
+        existing = query_checklists(None, None, sqlEngine, tables['checklists'])
+        hashes = data_hashes(d)
+        # only the dates whose observations changed are summarized again, the stored checklists of the
+        # unchanged dates are kept, and all the others dropped
+        changed, _ = changed_dates(sqlEngine, hashes, tables['versions'])
+        dates = set(existing['date'].astype(str)) - (set(hashes) - set(changed))
+        summary = summarize_checklists(compact_data(d[d['date'].astype(str).isin(changed)]), existing)
+        # the changed dates get a new data version before and after the update: if it fails half way, the
+        # files cached for these dates are not served any more
+        update_data_versions(sqlEngine, hashes, tables['versions'], pending=True)
+        bulk_load(d, tables['observations'], sqlEngine)
+        create_index(sqlEngine, tables['observations'], 'date')
+        update_checklists(sqlEngine, summary, dates, tables['checklists'])
+        update_data_versions(sqlEngine, hashes, tables['versions'])
         return None
 
     except sqlalchemy.exc.OperationalError:
         return 'Cannot connect to database - check if running'
+    except (sqlalchemy.exc.SQLAlchemyError, sqlite3.Error) as e:
+        # the observations table is left unchanged, see bulk_load
+        print(f'Import failed: {e!r}')
+        return f'Import failed: {e}'
 
 
-def query_database(start_date, end_date, sqlEngine, dbname):
+def bulk_load(d, table, sqlEngine, batch_size=BULK_BATCH):
+    """
+    Replaces a table by the rows of a DataFrame, much faster than `DataFrame.to_sql` for large imports.
+
+    On sqlite, the table is dropped, created and filled by batches in a single transaction, with the WAL journal
+    and synchronous=NORMAL. On MySQL, where DDL statements cannot be rolled back, the rows are loaded in a staging
+    table which then replaces the table by an atomic rename. They are sent with `LOAD DATA LOCAL INFILE` when
+    `local_infile: true` is set in the mysql config (it must also be allowed by the server), else by batches of
+    multi-row inserts. If the load fails, the previous table is left unchanged. The pandas index is not saved.
+
+    :param d: The DataFrame to save.
+    :param table: The name of the table.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param batch_size: The number of rows per executemany call.
+    :return: None
     """
-    Query the database for data between two dates.
+    d = d.reset_index(drop=True)
+    # tuples: SQLAlchemy rejects lists as executemany parameter sets
+    rows = list(d.astype(object).where(d.notna(), None).itertuples(index=False, name=None))
+    if is_sqlite():
+        sqlEngine.execute('pragma journal_mode=WAL')
+        sqlEngine.execute('pragma synchronous=NORMAL')
+        # explicit transaction: the sqlite3 module would otherwise commit the drop and create statements at once
+        sqlEngine.execute('begin')
+        try:
+            sqlEngine.execute(f'drop table if exists {quote_name(table)}')
+            sqlEngine.execute(pd.io.sql.get_schema(d, table, con=sqlEngine))
+            insert = _insert_sql(d, table)
+            for i in range(0, len(rows), batch_size):
+                sqlEngine.executemany(insert, rows[i:i + batch_size])
+        except BaseException:
+            sqlEngine.rollback()
+            raise
+        sqlEngine.commit()
+        return
+    staging, old = f'{table}__new', f'{table}__old'
+    with sqlEngine.connect() as cnx:
+        try:
+            cnx.exec_driver_sql(f'drop table if exists {quote_name(staging)}, {quote_name(old)}')
+            cnx.exec_driver_sql(pd.io.sql.get_schema(d, staging, con=sqlEngine))
+            if not (active_config()['mysql'].get('local_infile') and load_data_infile(d, staging, cnx)):
+                insert = _insert_sql(d, staging)
+                for i in range(0, len(rows), batch_size):
+                    # pymysql sends an executemany insert as multi-row insert statements
+                    cnx.exec_driver_sql(insert, rows[i:i + batch_size])
+            cnx.commit()
+            cnx.exec_driver_sql(f'create table if not exists {quote_name(table)} like {quote_name(staging)}')
+            cnx.exec_driver_sql(f'rename table {quote_name(table)} to {quote_name(old)}, '
+                                f'{quote_name(staging)} to {quote_name(table)}')
+        except BaseException:
+            cnx.rollback()
+            raise
+        finally:
+            cnx.exec_driver_sql(f'drop table if exists {quote_name(staging)}, {quote_name(old)}')
+            cnx.commit()
+
+
+def _insert_sql(d, table):
+    columns = ', '.join(quote_name(c) for c in d.columns)
+    return f'insert into {quote_name(table)} ({columns}) values ({", ".join([placeholder()] * len(d.columns))})'
+
+
+def create_index(sqlEngine, table, column):
+    """
+    Creates an index on a column of a table, if it does not exist.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param table: The name of the table.
+    :param column: The name of the column.
+    :return: None
+    """
+    name = quote_name(f'ix_{table}_{column}'.replace(' ', '_'))
+    if is_sqlite():
+        execute_sql(sqlEngine, f'create index if not exists {name} on {quote_name(table)} ({quote_name(column)})')
+        return
+    try:
+        # text columns are indexed on a prefix, 10 characters cover the ISO dates
+        execute_sql(sqlEngine, f'create index {name} on {quote_name(table)} ({quote_name(column)}(10))')
+    except sqlalchemy.exc.DBAPIError:
+        # already exists
+        pass
 
-    :param start_date: The start date of the data to query.
-    :param end_date: The end date of the data to query. If None, only data on start_date will be queried.
-    :param sqlEngine: The SQLAlchemy engine object to use for the database connection.
-    :param dbname: The name of the database table to query.
-    :return: A Pandas DataFrame containing the queried data.
 
+def load_data_infile(d, table, cnx):
     """
-    quote = '"' if (config['default']['db_dialect'] == 'sqlite') else '`'
-    query = (
-        f'select * from {quote}{dbname}{quote} where {quote}date{quote} >= "{start_date}"'
-        if end_date is None
-        else f'select * from {quote}{dbname}{quote} where {quote}date{quote} between "{start_date}" '
-             f'and "{end_date}"'
-    )
+    Loads a DataFrame into an existing MySQL table with `LOAD DATA LOCAL INFILE`.
+
+    :param d: The DataFrame to load.
+    :param table: The name of the table.
+    :param cnx: An open SQLAlchemy connection, with local_infile enabled.
+    :return: True if loaded, False if refused by the server.
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='UTF_8', newline='', delete=False) as f:
+        d.to_csv(f, index=False, header=False, lineterminator='\n')
+    columns = ', '.join(quote_name(c) for c in d.columns)
     try:
-        return pd.read_sql(query, con=sqlEngine)
-    except sqlalchemy.exc.OperationalError:
-        print('Cannot connect to MySQL database - check if running or cannot run query')
-        return pd.DataFrame()
+        cnx.exec_driver_sql(
+            f"load data local infile '{f.name}' into table {quote_name(table)} character set utf8mb4 "
+            f"fields terminated by ',' optionally enclosed by '\"' escaped by '' "
+            f"lines terminated by '\\n' ({columns})")
+        return True
+    except sqlalchemy.exc.DBAPIError as e:
+        print(f'LOAD DATA LOCAL INFILE refused, using inserts: {e.orig!r}')
+        return False
+    finally:
+        remove(f.name)
+
+
+def quote_name(name):
+    """
+    :param name: A table or column name.
+    :return: The name quoted for the configured SQL dialect.
+    """
+    quote = '"' if is_sqlite() else '`'
+    return f'{quote}{name}{quote}'
+
+
+def date_filter(start_date, end_date):
+    """
+    :param start_date: The start date of the data to query. If None, no filter is applied.
+    :param end_date: The end date of the data to query. If None, all data as from start_date is selected.
+    :return: The SQL `where` clause selecting the date range.
+    """
+    if start_date is None:
+        return ''
+    if end_date is None:
+        return f' where {quote_name("date")} >= "{start_date}"'
+    return f' where {quote_name("date")} between "{start_date}" and "{end_date}"'
+
+
+def execute_sql(sqlEngine, query, params=None):
+    """
+    Executes a statement which does not return rows, e.g. a `delete`.
 
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param query: The SQL statement, with `placeholder()` markers for the parameters.
+    :param params: A list of parameter tuples, the statement is executed once per tuple.
+    :return: None
+    """
+    if is_sqlite():
+        if params is None:
+            sqlEngine.execute(query)
+        else:
+            sqlEngine.executemany(query, params)
+        sqlEngine.commit()
+    else:
+        with sqlEngine.begin() as cnx:
+            cnx.exec_driver_sql(query, params if params is not None else ())
+
+
+def placeholder():
+    """
+    :return: The parameter marker of the database driver, for `execute_sql`.
+    """
+    return '?' if is_sqlite() else '%s'
+
+
+def write_table(df, table, sqlEngine, if_exists='append'):
+    """
+    Writes a DataFrame to a database table, without the pandas index.
+
+    :param df: The DataFrame to write.
+    :param table: The name of the table.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param if_exists: 'append' or 'replace', as for `DataFrame.to_sql`.
+    :return: None
+    """
+    if is_sqlite():
+        df.to_sql(name=table, con=sqlEngine, if_exists=if_exists, index=False)
+        sqlEngine.commit()
+    else:
+        with sqlEngine.begin() as cnx:
+            df.to_sql(name=table, con=cnx, if_exists=if_exists, index=False)
 
-def prepare_data(df):
+
+def compact_data(df):
+    """
+    Converts the raw query result into a compact, typed DataFrame.
+
+    The observations are stored as strings at import time. This converts them once, right after the query,
+    so that the export loop works on numbers only:
+    coordinates become float64, counts (nullable) integers, times minutes since midnight (NaN if unknown) and
+    species and location names categories. Columns not used by the export are dropped.
+
+    :param df: The observations read from the database, see `fetch_days`, or from observation.org files.
+    :return: The compact DataFrame.
+    """
+    return pd.DataFrame({
+        'date': df['date'].astype('category'),
+        'time': to_minutes(df['time']),
+        'species name': df['species name'].astype('category'),
+        'number': pd.to_numeric(df['number'], errors='coerce').astype('Int32'),
+        'location': df['location'].astype('category'),
+        'lat': pd.to_numeric(df['lat'], errors='coerce').astype('float64'),
+        'lng': pd.to_numeric(df['lng'], errors='coerce').astype('float64'),
+    })
+
+
+def prepare_data(df, mappings=None, unmapped=None, radius=None):
     """
     Prepares the data by modifying the given DataFrame.
 
-    :param df: The DataFrame containing the data to be prepared.
+    :param df: The compact DataFrame (see `compact_data`) containing the data to be prepared.
+    :param mappings: The {'species': {...}, 'location': {...}} name mappings to apply, see `load_mappings`.
+    :param unmapped: A {'species': set(), 'location': set()} dictionary collecting the names without mapping.
+    :param radius: If set, the observations of a day closer than this distance (meters) are grouped in the same
+                   checklist location, see `cluster_locations`.
     :return: The prepared DataFrame grouped by 'date' and 'location'.
 
     """
-    df['location'] = df.apply(lambda x: x['location'].split('-')[0], axis=1)
-    df['name'] = df['species name']
-    grp = df.groupby(['date', 'location'])
+    mappings = mappings or {}
+    unmapped = unmapped if unmapped is not None else {}
+    # split the location names once per category instead of once per row
+    locations = df['location'].cat.categories.str.split('-').str[0]
+    df['location'] = pd.Categorical(locations.take(df['location'].cat.codes))
+    if radius:
+        df['location'] = cluster_locations(df, float(radius))
+    # the checklist stays keyed by the original location name, the mapped one is used in the eBird file
+    df['location name'] = map_names(df['location'], mappings.get('location'), unmapped.get('location'))
+    df['name'] = map_names(df['species name'], mappings.get('species'), unmapped.get('species'))
+    df['ebird date'] = to_ebird_dates(df['date'])
+    grp = df.groupby(['date', 'location'], observed=True, sort=True)
     return grp
 
 
+def map_names(names, mapping, unmapped=None):
+    """
+    Maps the categories of a categorical Series, i.e. once per distinct name.
+
+    :param names: A categorical Pandas Series.
+    :param mapping: A {name: eBird name} dictionary. Names are kept as is if None or not in the mapping.
+    :param unmapped: A set collecting the names not in the mapping.
+    :return: The mapped categorical Series.
+    """
+    if not mapping:
+        return names
+    categories = names.cat.categories
+    if unmapped is not None:
+        unmapped.update(c for c in categories if c not in mapping)
+    mapped = pd.Index([mapping.get(c, c) for c in categories])
+    return pd.Series(pd.Categorical(mapped.take(names.cat.codes)), index=names.index)
+
+
 def get_location_info(lat, lon):
     """
     :param lat: float representing the latitude of the location
@@ -154,16 +549,27 @@ def get_location_info(lat, lon):
     :return: dictionary containing the state and country information of the given location
 
     This method takes latitude and longitude as input parameters and returns a dictionary with the state and
-    country information of the given location.
+    country information of the given location, using the providers configured in the `geocoders` section of the
+    config (see `geocoders.create_geocoder`).
 
     Example usage:
 
     >>> get_location_info(37.7749, -122.4194)
     {'state': 'California', 'country': 'US'}
     """
-    location = geolocator.reverse(f"{lat},{lon}").raw['address']
-    code = [c for c in location.keys() if 'ISO3166' in c][0]
-    return {'state': location[code].split('-')[1], 'country': location['country_code'].upper()}
+    return get_geocoder().reverse(lat, lon)
+
+
+def get_geocoder():
+    """
+    :return: The Geocoder of the active config `geocoders` section, shared by all the threads using it.
+    """
+    settings = active_config().get('geocoders')
+    key = repr(settings)
+    with _geocoders_lock:
+        if key not in _geocoders:
+            _geocoders[key] = create_geocoder(settings)
+        return _geocoders[key]
 
 
 def get_distance_and_protocol(data):
@@ -171,141 +577,791 @@ def get_distance_and_protocol(data):
     :param data: Pandas DataFrame containing latitude and longitude coordinates for each location.
     :return: Dictionary with keys 'distance' and 'protocol'. 'distance' is the total distance traveled between
     locations in miles, and 'protocol' is either 'traveling' if there was any distance traveled, or 'stationary'
-    if there was no distance traveled.
+    if there was no distance traveled. The observations without coordinates are ignored.
 
     """
-    miles = 0
-    p_lat = data.iloc[0]['lat']
-    p_lon = data.iloc[0]['lng']
-    for idx, r in data.iterrows():
-        if r['id'] == data.iloc[0]['id']:
-            continue
-        lat = str(r['lat'])
-        lon = str(r['lng'])
-        miles += distance.distance((lat, lon), (p_lat, p_lon)).miles
-        p_lat = lat
-        p_lon = lon
+    lats = data['lat'].to_numpy(dtype=float)
+    lons = data['lng'].to_numpy(dtype=float)
+    valid = np.isfinite(lats) & np.isfinite(lons)
+    lats, lons = lats[valid], lons[valid]
+    miles = sum(
+        distance.distance((lats[i], lons[i]), (lats[i - 1], lons[i - 1])).miles
+        for i in range(1, len(lats))
+    )
     return {'distance': miles, 'protocol': 'traveling' if (miles > 0) else 'stationary'}
 
 
-def parse_group(g, header):
+def summarize_group(g_df):
+    """
+    :param g_df: Pandas DataFrame with the observations of one checklist, sorted by time.
+    :return: Dictionary with the start time (minutes since midnight), duration, first coordinates,
+    distance and protocol of the checklist. The observations without a valid time are ignored for the start time
+    and duration, which are NaN if none has one. The coordinates are NaN if no observation has any.
+    """
+    times = g_df['time'].dropna()
+    start_time = times.min() if len(times) != 0 else np.nan
+    located = g_df[g_df['lat'].notna() & g_df['lng'].notna()]
+    row = located.iloc[0] if len(located) != 0 else {'lat': np.nan, 'lng': np.nan}
+    dist_protocol_info = get_distance_and_protocol(g_df)
+    return {
+        'start_time': start_time if pd.isna(start_time) else int(start_time),
+        'duration': np.nan if pd.isna(start_time) else int(1 + times.max() - start_time),
+        'lat': float(row['lat']),
+        'lng': float(row['lng']),
+        'distance': dist_protocol_info['distance'],
+        'protocol': dist_protocol_info['protocol']
+    }
+
+
+def has_coordinates(summary):
+    """
+    :param summary: A checklist summary, see `summarize_group`.
+    :return: True if the checklist has coordinates to geocode.
+    """
+    return not (pd.isna(summary['lat']) or pd.isna(summary['lng']))
+
+
+def known_places(checklists):
+    """
+    :param checklists: Stored checklists, see `query_checklists`. May be None.
+    :return: The {(lat, lng): {'state': ..., 'country': ...}} dictionary of their geocoded coordinates.
+    """
+    places = {}
+    if checklists is not None:
+        for r in checklists.itertuples():
+            if r.state != '':
+                places[(r.lat, r.lng)] = {'state': r.state, 'country': r.country}
+    return places
+
+
+def nearest_place(places, lat, lng, max_distance):
+    """
+    :param places: The known state and country by coordinates, see `known_places`.
+    :param lat: The latitude of the location.
+    :param lng: The longitude of the location.
+    :param max_distance: The maximum distance to a known place, in meters.
+    :return: The state and country of the nearest known place within max_distance, None if there is none.
+    """
+    if (lat, lng) in places:
+        return places[(lat, lng)]
+    if not max_distance or not places:
+        return None
+    coords = np.array(list(places.keys()), dtype=float)
+    # equirectangular approximation, precise enough at the scale of a clustering radius
+    dy = np.radians(coords[:, 0] - lat)
+    dx = np.radians(coords[:, 1] - lng) * np.cos(np.radians(lat))
+    d2 = (dx * dx + dy * dy) * EARTH_RADIUS ** 2
+    i = int(np.argmin(d2))
+    return places[tuple(coords[i])] if d2[i] <= max_distance ** 2 else None
+
+
+def summarize_checklists(df, known=None):
+    """
+    Computes the checklists summary table, one row per date and location.
+
+    :param df: The compact DataFrame (see `compact_data`) of the observations.
+    :param known: Previously stored checklists. Their state and country are reused for the same
+                  coordinates instead of geocoding them again.
+    :return: A Pandas DataFrame with the CHECKLIST_COLUMNS columns.
+    """
+    places = known_places(known)
+    rows = []
+    for (g_date, g_loc), g_df in prepare_data(df):
+        summary = summarize_group(g_df.sort_values(by=['time'], kind='stable'))
+        coords = (summary['lat'], summary['lng'])
+        if not has_coordinates(summary):
+            places[coords] = {'state': '', 'country': ''}
+        elif coords not in places:
+            try:
+                places[coords] = get_location_info(*coords)
+            except (GeopyError, KeyError, IndexError):
+                # left empty, the export will try again
+                places[coords] = {'state': '', 'country': ''}
+        rows.append({'date': g_date, 'location': g_loc, **summary, **places[coords]})
+    return pd.DataFrame(rows, columns=CHECKLIST_COLUMNS)
+
+
+def query_checklists(start_date, end_date, sqlEngine, table=CHECKLISTS):
+    """
+    Query the checklists table for checklists between two dates.
+
+    :param start_date: The start date of the data to query. If None, all checklists are returned.
+    :param end_date: The end date of the data to query. If None, all checklists as from start_date are returned.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param table: The checklists table, see `observer_tables`.
+    :return: A Pandas DataFrame, empty if the table does not exist yet.
+    """
+    query = f'select * from {quote_name(table)}{date_filter(start_date, end_date)}'
+    try:
+        return pd.read_sql(query, con=sqlEngine).fillna({'state': '', 'country': ''})
+    except (pd.errors.DatabaseError, sqlalchemy.exc.SQLAlchemyError):
+        return pd.DataFrame(columns=CHECKLIST_COLUMNS)
+
+
+def delete_checklists(sqlEngine, dates, table=CHECKLISTS):
+    """
+    Deletes the checklists of the given dates.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param dates: Iterable of ISO dates.
+    :param table: The checklists table, see `observer_tables`.
+    :return: None
+    """
+    dates = sorted(dates)
+    for i in range(0, len(dates), 500):
+        values = ', '.join(f"'{x}'" for x in dates[i:i + 500])
+        execute_sql(sqlEngine, f'delete from {quote_name(table)} where {quote_name("date")} in ({values})')
+
+
+def update_checklists(sqlEngine, summary, dates, table=CHECKLISTS):
+    """
+    Replaces the stored checklists of the given dates by the ones of newly imported observations. The
+    checklists of the other dates are kept.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param summary: The checklists of the imported observations of these dates, see `summarize_checklists`.
+    :param dates: Iterable of the ISO dates whose checklists are replaced, see `changed_dates`.
+    :param table: The checklists table, see `observer_tables`.
+    :return: None
+    """
+    delete_checklists(sqlEngine, dates, table)
+    write_table(summary, table, sqlEngine)
+
+
+def create_mapping_table(sqlEngine):
+    """
+    Creates the name mappings table, indexed on (kind, source), if it does not exist.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :return: None
+    """
+    execute_sql(sqlEngine, f'create table if not exists {quote_name(MAPPINGS)} ('
+                           f'{quote_name("kind")} varchar(16) not null, '
+                           f'{quote_name("source")} varchar(255) not null, '
+                           f'{quote_name("target")} varchar(255) not null, '
+                           f'primary key ({quote_name("kind")}, {quote_name("source")}))')
+
+
+def load_mappings(sqlEngine):
+    """
+    Loads the species and location name mappings. The table is read once, the mappings are then served
+    from memory until they are changed by `add_mappings` or the config changes.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :return: A {'species': {name: eBird name}, 'location': {name: eBird name}} dictionary.
+    """
+    key = db_key()
+    if key not in _mappings:
+        mappings = {kind: {} for kind in MAPPING_KINDS}
+        try:
+            for kind, source, target in pd.read_sql(f'select * from {quote_name(MAPPINGS)}',
+                                                    con=sqlEngine).itertuples(index=False):
+                mappings.setdefault(kind, {})[source] = target
+        except (pd.errors.DatabaseError, sqlalchemy.exc.SQLAlchemyError):
+            pass
+        _mappings[key] = mappings
+    return _mappings[key]
+
+
+def add_mappings(sqlEngine, kind, pairs):
+    """
+    Adds or replaces name mappings.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param kind: 'species' or 'location'.
+    :param pairs: An iterable of (name, eBird name) tuples. Mapping a name to itself marks it as accepted.
+    :return: None
+    """
+    if kind not in MAPPING_KINDS:
+        raise ValueError(f'Unknown mapping kind "{kind}"')
+    create_mapping_table(sqlEngine)
+    mark = placeholder()
+    execute_sql(sqlEngine, f'replace into {quote_name(MAPPINGS)} values ({mark}, {mark}, {mark})',
+                [(kind, source, target) for source, target in pairs])
+    _mappings.pop(db_key(), None)
+
+
+def import_mappings(mapping_file):
+    """
+    Imports name mappings from a CSV file with `kind`, `source` and `target` columns.
+    Rows without target are skipped, so that a completed unmapped names report can be imported as is.
+
+    :param mapping_file: The path to the CSV file.
+    :return: None|str  A status string is return in case of error
+    """
+    sqlEngine, db = db_conn()
+    if db is None:
+        return "Error in creating the database connection"
+    d = pd.read_csv(mapping_file, dtype=str).fillna('')
+    # rows of an unmapped names report which were not completed
+    d = d[d['target'] != '']
+    for kind, rows in d.groupby('kind'):
+        try:
+            add_mappings(sqlEngine, kind, zip(rows['source'], rows['target']))
+        except ValueError as e:
+            return str(e)
+
+
+def resolve_species(start_date, end_date, sqlEngine, dbname):
+    """
+    Matches the species names of a date range without mapping against the eBird taxonomy file set in the
+    config (`taxonomy: {file: ..., min_score: ...}`), in one batch. The matches scoring at least
+    min_score are saved as species mappings, so that each name is only matched once.
+
+    :param start_date: The start date of the data to query.
+    :param end_date: The end date of the data to query. If None, all data as from start_date is queried.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param dbname: The name of the database table to query.
+    :return: The {name: (eBird name, score)} matches of the names without mapping, see `TaxonomyMatcher.match`.
+    """
+    taxonomy = active_config().get('taxonomy') or {}
+    if not taxonomy.get('file'):
+        return {}
+    from taxonomy import get_matcher
+    # the scientific name column is not in every observation.org export. It is checked in the table columns:
+    # sqlite reads a quoted unknown column as a string literal instead of failing.
+    columns = [c for c in ('species name', 'scientific name') if c in table_columns(sqlEngine, dbname)]
+    if 'species name' not in columns:
+        return {}
+    try:
+        names = pd.read_sql(f'select distinct {", ".join(quote_name(c) for c in columns)} from {quote_name(dbname)}'
+                            f'{date_filter(start_date, end_date)}', con=sqlEngine)
+    except (pd.errors.DatabaseError, sqlalchemy.exc.SQLAlchemyError):
+        return {}
+    if len(names) == 0:
+        return {}
+    mapped = load_mappings(sqlEngine)['species']
+    names = names[~names['species name'].isin(mapped)]
+    matches = get_matcher(taxonomy['file']).match_all(names['species name'], names.get('scientific name'))
+    min_score = float(taxonomy.get('min_score', DEFAULT_MIN_SCORE))
+    accepted = [(name, target) for name, (target, score) in matches.items()
+                if target is not None and score >= min_score]
+    if accepted:
+        add_mappings(sqlEngine, 'species', accepted)
+    return matches
+
+
+def table_columns(sqlEngine, table):
+    """
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param table: The name of the table.
+    :return: The list of the column names of the table, empty if it does not exist.
+    """
+    if is_sqlite():
+        return [r[1] for r in sqlEngine.execute(f'pragma table_info({quote_name(table)})').fetchall()]
+    try:
+        return [c['name'] for c in sqlalchemy.inspect(sqlEngine).get_columns(table)]
+    except sqlalchemy.exc.NoSuchTableError:
+        return []
+
+
+def unmapped_report_file(output_file):
+    """
+    :param output_file: The path to the eBird file.
+    :return: The path of its unmapped names report.
+    """
+    return f'{splitext(output_file)[0]}_unmapped.csv'
+
+
+def write_unmapped_report(output_file, unmapped):
+    """
+    Writes the names without mapping next to the eBird file, as <output_file>_unmapped.csv
+
+    :param output_file: The path to the eBird file.
+    :param unmapped: A {kind: set of names} dictionary.
+    :return: The path of the report.
+    """
+    report_file = unmapped_report_file(output_file)
+    with open(report_file, 'w') as csv_file:
+        wr = csv.writer(csv_file, delimiter=',')
+        wr.writerow(['kind', 'source', 'target'])
+        for kind, names in unmapped.items():
+            for name in sorted(names):
+                wr.writerow([kind, name, ''])
+    print(f'{sum(len(x) for x in unmapped.values())} names without mapping, see {report_file}')
+    return report_file
+
+
+def data_hashes(d):
+    """
+    :param d: The imported observations.
+    :return: A {date: hash} dictionary with the content hash of the observations of each date.
+    """
+    if len(d) == 0:
+        return {}
+    rows = pd.util.hash_pandas_object(d.reset_index(drop=True).astype(str), index=False)
+    # sum of the row hashes: independent of the order of the rows
+    return rows.groupby(d['date'].astype(str).to_numpy()).sum().astype(str).to_dict()
+
+
+def changed_dates(sqlEngine, hashes, table=DATA_VERSIONS):
+    """
+    Compares the content hashes of imported observations with the stored ones, creating the data versions table
+    if it does not exist.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param hashes: The content hashes of the imported observations, see `data_hashes`.
+    :param table: The data versions table, see `observer_tables`.
+    :return: A (dates, version) tuple: the sorted dates whose hash changed, i.e. new dates, dates no longer in
+             the imported data and dates with another or a pending hash, and the next version number.
+    """
+    execute_sql(sqlEngine, f'create table if not exists {quote_name(table)} ('
+                           f'{quote_name("date")} varchar(10) not null primary key, '
+                           f'{quote_name("hash")} varchar(20) not null, '
+                           f'{quote_name("version")} integer not null)')
+    existing = pd.read_sql(f'select * from {quote_name(table)}', con=sqlEngine)
+    old = dict(zip(existing['date'], existing['hash']))
+    new = {**{x: '' for x in old}, **hashes}
+    changed = sorted(x for x, h in new.items() if old.get(x) != h)
+    return changed, int(existing['version'].max()) + 1 if len(existing) != 0 else 1
+
+
+def update_data_versions(sqlEngine, hashes, table=DATA_VERSIONS, pending=False):
+    """
+    Bumps the data version of the dates whose observations were changed by an import.
+
+    A content hash of the observations of each date is kept with its version. Dates whose hash changed, new
+    dates and dates no longer in the imported data get the next version number; re-importing the same data
+    leaves the versions unchanged.
+
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param hashes: The content hashes of the imported observations, which replaced the previous ones, see
+                   `data_hashes`.
+    :param table: The data versions table, see `observer_tables`.
+    :param pending: If True, the changed dates get a new version with an empty hash, before the observations are
+                    replaced. They are then counted as changed by the call made once the import is complete.
+    :return: None
+    """
+    changed, version = changed_dates(sqlEngine, hashes, table)
+    if not changed:
+        return
+    mark = placeholder()
+    execute_sql(sqlEngine, f'replace into {quote_name(table)} values ({mark}, {mark}, {mark})',
+                [(x, '' if pending else hashes.get(x, ''), version) for x in changed])
+
+
+def export_cache_key(start_date, end_date, sqlEngine, mappings, tables):
+    """
+    Computes the key of an export: a hash of the date range, the database, observer and clustering config,
+    the name mappings and the data versions of the dates in range (see `update_data_versions`). It identifies
+    both the cached file and the checkpoint of the export.
+
+    :param start_date: The start date of the export.
+    :param end_date: The end date of the export.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param mappings: The name mappings of the export, see `load_mappings`.
+    :param tables: The tables of the observer, see `observer_tables`.
+    :return: The key.
+    """
+    try:
+        versions = pd.read_sql(f'select {quote_name("date")}, {quote_name("version")} from '
+                               f'{quote_name(tables["versions"])}{date_filter(start_date, end_date)} '
+                               f'order by {quote_name("date")}', con=sqlEngine).to_numpy().tolist()
+    except (pd.errors.DatabaseError, sqlalchemy.exc.SQLAlchemyError):
+        # data imported before the data versions: the next import creates them, which changes the key
+        versions = None
+    payload = {
+        'format': CACHE_FORMAT,
+        'range': [start_date, end_date],
+        'db': db_key(),
+        'tables': tables,
+        'clustering': clustering_radius(),
+        'mappings': {kind: sorted(mapping.items()) for kind, mapping in mappings.items()},
+        'versions': versions
+    }
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+def get_export_cache():
+    """
+    :return: The ExportCache of the active config `cache: {dir: ..., max_size_mb: ...}` section.
+    """
+    settings = active_config().get('cache') or {}
+    return ExportCache(settings.get('dir', DEFAULT_CACHE_DIR), settings.get('max_size_mb', DEFAULT_CACHE_SIZE_MB))
+
+
+def parse_group(g, summary=None, places=None):
     """
     The `parse_group` method takes two parameters and returns two values.
 
     :param g: A tuple containing the date and location information of a group.
-    :param header: A dictionary representing the header information.
-
-    :return: A tuple containing the observation data and the updated header information.
-    """
-    g_date, g_loc = g[0]
-    g_df = g[1].sort_values(by=['time'])
-    g_year, g_mm, g_dd = re.findall(r'(\d{4})-(\d{2})-(\d{2})', g_date, re.DOTALL)[0]
-    g_date = f'{g_mm}/{g_dd}/{g_year}'
-    row = g_df.iloc[0]
-    start_time = row['time']
-    last_time = g_df.iloc[-1]['time']
-    s_time = datetime.datetime.strptime(start_time, "%H:%M:%S")
-    l_time = datetime.datetime.strptime(last_time, "%H:%M:%S")
-    duration = int(1 + (l_time - s_time).total_seconds() / 60)
-    coords_info = get_location_info(str(row['lat']), str(row['lng']))
-    dist_protocol_info = get_distance_and_protocol(g_df)
+    :param summary: The checklists table row of the group, as a dictionary. Computed if None.
+    :param places: The known state and country by coordinates, see `known_places`. The coordinates geocoded
+                   for the group are added to it.
 
-    header['Location'].append(g_loc)
-    header['Latitude'].append(str(row['lat']))
-    header['Longitude'].append(str(row['lng']))
-    header['Date'].append(g_date)
-    header['Start Time'].append(start_time)
-    header['State'].append(coords_info['state'])
-    header['Country'].append(coords_info['country'])
-    header['Protocol'].append(dist_protocol_info['protocol'])
-    header['Num Observers'].append(1)
-    header['Duration (min)'].append(duration)
-    header['All Obs Reported (Y/N)'].append('Y')
-    header['Dist Traveled (Miles)'].append(dist_protocol_info['distance'])
-    header['Area Covered (Acres)'].append('')
-    header['Notes'].append('')
-    obs = g_df[['name', 'number']]
+    :return: A tuple containing the observations of the checklist, as a {species: number} dictionary,
+    and its header column, as a {HEADER_FIELDS: value} dictionary.
+    """
+    g_df = g[1].sort_values(by=['time'], kind='stable')
+    g_loc = g_df['location name'].iloc[0]
+    g_date = g_df['ebird date'].iloc[0]
+    if summary is None:
+        summary = summarize_group(g_df)
+    if summary.get('state', '') == '' and has_coordinates(summary):
+        places = {} if places is None else places
+        coords = (summary['lat'], summary['lng'])
+        if coords not in places:
+            # with clustering, a place already geocoded within the clustering radius gives the state and country
+            place = nearest_place(places, *coords, clustering_radius() or 0)
+            places[coords] = place if place is not None else get_location_info(*coords)
+        summary.update(places[coords])
+
+    column = {
+        'Location': g_loc,
+        'Latitude': str(summary['lat']) if has_coordinates(summary) else '',
+        'Longitude': str(summary['lng']) if has_coordinates(summary) else '',
+        'Date': g_date,
+        'Start Time': '' if pd.isna(summary['start_time']) else format_time(int(summary['start_time'])),
+        'State': summary.get('state', ''),
+        'Country': summary.get('country', ''),
+        'Protocol': summary['protocol'],
+        'Num Observers': 1,
+        'Duration (min)': '' if pd.isna(summary['duration']) else int(summary['duration']),
+        'All Obs Reported (Y/N)': 'Y',
+        'Dist Traveled (Miles)': summary['distance'],
+        'Area Covered (Acres)': '',
+        'Notes': ''
+    }
+    obs = {name: '' if pd.isna(nr) else nr for name, nr in zip(g_df['name'], g_df['number'])}
 
-    return obs, header
+    return obs, column
 
 
-def write_csv(output_file, header, obs, df):
+def fetch_days(start_date, end_date, sqlEngine, dbname, chunksize=CHUNKSIZE):
+    """
+    Fetches the observations between two dates, one day at a time.
+
+    The rows are read in chunks ordered by date, so that only the current chunk and the observations of
+    the day being completed are held in memory.
+
+    :param start_date: The start date of the data to query.
+    :param end_date: The end date of the data to query. If None, all data as from start_date is queried.
+    :param sqlEngine: The sqlite connection or SQLAlchemy engine returned by `db_conn`.
+    :param dbname: The name of the database table to query.
+    :param chunksize: The number of rows fetched at once.
+    :return: A generator of compact DataFrames (see `compact_data`), one per day. Nothing is generated if the
+             database cannot be queried at all.
+    :raise sqlalchemy.exc.OperationalError: If the connection is lost once rows were fetched, rather than
+                                            ending the range early.
+    """
+    query = f'select * from {quote_name(dbname)}{date_filter(start_date, end_date)} order by {quote_name("date")}'
+    pending = None
+    fetched = False
+    cnx = sqlEngine
+    try:
+        if not is_sqlite():
+            # server side cursor, rows are transferred as they are consumed
+            cnx = sqlEngine.connect().execution_options(stream_results=True)
+        for chunk in pd.read_sql(query, con=cnx, chunksize=chunksize):
+            if len(chunk) == 0:
+                continue
+            fetched = True
+            if pending is not None:
+                chunk = pd.concat([pending, chunk])
+            # the last day of the chunk may continue in the next one
+            last = chunk['date'] == chunk['date'].iloc[-1]
+            pending = chunk[last]
+            for _, day in chunk[~last].groupby('date', sort=False):
+                yield compact_data(day)
+    except sqlalchemy.exc.OperationalError:
+        print('Cannot connect to MySQL database - check if running or cannot run query')
+        if fetched:
+            raise
+    finally:
+        if cnx is not sqlEngine:
+            cnx.close()
+    if pending is not None:
+        yield compact_data(pending)
+
+
+def iter_checklists(days, mappings=None, unmapped=None, radius=None):
+    """
+    :param days: An iterable of compact DataFrames, see `fetch_days`.
+    :param mappings: The name mappings to apply, see `prepare_data`.
+    :param unmapped: A dictionary collecting the names without mapping, see `prepare_data`.
+    :param radius: The location clustering distance, see `prepare_data`.
+    :return: A generator of the (date, location) groups of each day, see `prepare_data`.
+    """
+    for day in days:
+        yield from prepare_data(day, mappings, unmapped, radius)
+
+
+def enrich_checklists(groups, summaries, checkpoint=None, failed=None, places=None):
+    """
+    :param groups: An iterable of (date, location) groups, see `iter_checklists`.
+    :param summaries: The checklists table rows as a {(date, location): row} dictionary.
+    :param checkpoint: An open checkpoint, see `open_checkpoint`. Checklists found in the checkpoint are
+                       reused, the others are appended to it as they complete.
+    :param failed: A list collecting the (date, location, error) of the checklists which still fail after
+                   RETRIES attempts. These are skipped instead of aborting the export.
+    :param places: The known state and country by coordinates, see `known_places`, shared by the checklists
+                   so that each location is geocoded once.
+    :return: A generator of (observations, column) tuples, see `parse_group`.
+    """
+    done, log = checkpoint if checkpoint is not None else ({}, None)
+    places = {} if places is None else places
+    for g in groups:
+        key = (str(g[0][0]), str(g[0][1]))
+        if key in done:
+            yield done[key]
+            continue
+        for attempt in range(RETRIES):
+            try:
+                obs, column = parse_group(g, summaries.get(g[0]), places)
+                break
+            except (GeopyError, OSError, KeyError, IndexError) as e:
+                if attempt + 1 < RETRIES:
+                    time.sleep(RETRY_DELAY * (attempt + 1))
+                    continue
+                print(f'Checklist {key[0]} {key[1]} failed: {e!r}')
+                if failed is not None:
+                    failed.append((*key, repr(e)))
+        else:
+            continue
+        if log is not None:
+            log.write(json.dumps({'key': key, 'obs': obs, 'column': column}, default=str) + '\n')
+            log.flush()
+        yield obs, column
+
+
+def open_checkpoint(checkpoint_file, run):
+    """
+    Opens the checkpoint file of an export, keeping the checklists already completed by a previous run of the
+    same export.
+
+    :param checkpoint_file: The path of the checkpoint file.
+    :param run: The id of the export, see `export_cache_key`. A checkpoint of another export is discarded.
+    :return: A ({(date, location): (observations, column)}, open file) tuple, for `enrich_checklists`.
+    """
+    done = {}
+    if exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            lines = iter(f)
+            if json.loads(next(lines, 'null')) == {'run': run}:
+                for line in lines:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        # last line cut by an interrupted run
+                        break
+                    done[tuple(r['key'])] = (r['obs'], r['column'])
+    log = open(checkpoint_file, 'w')
+    log.write(json.dumps({'run': run}) + '\n')
+    for key, (obs, column) in done.items():
+        log.write(json.dumps({'key': key, 'obs': obs, 'column': column}, default=str) + '\n')
+    log.flush()
+    return done, log
+
+
+def write_csv(output_file, checklists):
     """
     Write data to a CSV file.
 
-    :param output_file: str, the path to the output CSV file.
-    :param header: dict, a dictionary containing header information for the CSV file.
-    :param obs: list, a list of data objects.
-    :param df: pandas.DataFrame, a DataFrame containing data.
+    The eBird spreadsheet format has one column per checklist, so the columns are collected before the
+    file is written. The file is not created if there is no checklist.
+
+    :param output_file: str, the path to the output CSV file, or an open text file.
+    :param checklists: iterable of (observations, column) tuples, see `parse_group`.
+    :return: int, the number of checklists written.
+    """
+    columns = []
+    names = {}
+    for i, (obs, column) in enumerate(checklists):
+        columns.append(column)
+        for name, nr in obs.items():
+            names.setdefault(name, {})[i] = nr
+    if len(columns) == 0:
+        return 0
+
+    if isinstance(output_file, str):
+        with open(output_file, 'w') as csv_file:
+            write_rows(csv_file, columns, names)
+    else:
+        write_rows(output_file, columns, names)
+    return len(columns)
+
+
+def write_rows(csv_file, columns, names):
+    """
+    :param csv_file: An open text file.
+    :param columns: list, the header column of each checklist.
+    :param names: dict, the {checklist index: number} observations of each species.
     :return: None
     """
-    with open(output_file, 'w') as csv_file:
-        wr = csv.writer(csv_file, delimiter=',')
-        for k, v in header.items():
-            row = ['' if k == 'Location' else k, ''] + v
-            wr.writerow(row)
-        names = {species: [species] + [''] * (len(obs) + 1) for species in df['name'].unique()}
-        for i, o in enumerate(obs):
-            for x in o.iterrows():
-                name, nr = x[1]['name'], x[1]['number']
-                names[name][i + 2] = nr
-        for r in names.values():
-            wr.writerow(r)
+    wr = csv.writer(csv_file, delimiter=',')
+    for k in HEADER_FIELDS:
+        row = ['' if k == 'Location' else k, ''] + [c[k] for c in columns]
+        wr.writerow(row)
+    for name, counts in names.items():
+        wr.writerow([name, ''] + [counts.get(i, '') for i in range(len(columns))])
 
 
-def export_to_ebird(output_file, start_date, end_date):
+def export_to_ebird(output_file, start_date, end_date, observer=None):
     """
-    :param output_file: The path to the output file where the eBird data will be exported.
+    :param output_file: The path to the output file where the eBird data will be exported, or an open text file.
     :param start_date: The start date for querying the database.
     :param end_date: The end date for querying the database.
+    :param observer: The observer whose observations are exported, see `observer_tables`.
     :return: None|str None if OK, else a status message
 
     This method exports bird observation data from a MySQL database to eBird format.
     The exported data will be written to the specified output file.
 
-    The method first initializes a dictionary called `header` that represents the eBird data header.
-    It contains keys for various fields like `Location`, `Latitude`, `Longitude`, etc.
-    The values for these keys will be populated later during the data parsing process.
-
-    The method then establishes a connection to the MySQL database and queries the data for the specified date range.
-    If no data is found, a message is printed and the method exits.
-
-    Next, the method prepares the data for export by grouping it based on location.
-    Each group is then parsed to extract relevant information and append it to the `obs` list.
-    Additionally, the `header` dictionary is updated with the appropriate values.
-
-    Finally, the method writes the CSV file using the `write_csv` function, passing the output file path,
-    the `header` dictionary, the `obs` list, and the original data DataFrame.
-    """
-    header = {
-        'Location': [],
-        'Latitude': [],
-        'Longitude': [],
-        'Date': [],
-        'Start Time': [],
-        'State': [],
-        'Country': [],
-        'Protocol': [],
-        'Num Observers': [],
-        'Duration (min)': [],
-        'All Obs Reported (Y/N)': [],
-        'Dist Traveled (Miles)': [],
-        'Area Covered (Acres)': [],
-        'Notes': []
-    }
-    obs = []
+    The export is a pipeline of generators: the observations are fetched one day at a time
+    (`fetch_days`), split into checklists (`iter_checklists`), enriched with the checklists table
+    summaries, geocoding and distance (`enrich_checklists`) and finally written by `write_csv`.
+    If no data is found, a message is returned and no file is written.
+
+    Generated files are cached (see `export_cache_key`): exporting again the same unchanged data copies the
+    cached file instead.
 
+    With a `clustering: {radius: <meters>}` config, the observations of a day closer than the radius are grouped
+    in one checklist, whatever their location name (see `cluster_locations`).
+
+    The completed checklists are saved in a <output_file>.checkpoint file. If the export is interrupted or some
+    checklists fail, e.g. because the geocoding service is not reachable, running it again reuses them and
+    only processes the remaining ones. The checkpoint file is removed once the export is complete. The output file
+    is only written, through a temporary <output_file>.tmp file, when all the checklists succeeded.
+
+    The species and location names are mapped to their eBird names (see `load_mappings`), the species without
+    mapping being first matched against the eBird taxonomy if configured (see `resolve_species`). When mappings are
+    defined, the names without mapping are listed in a single <output_file>_unmapped.csv report.
+    """
     sqlEngine, db = db_conn()
-    df = query_database(start_date, end_date, sqlEngine, db)
-    if len(df) == 0:
+    if db is None:
+        return 'Error in creating the database connection'
+    try:
+        tables = observer_tables(db, observer)
+    except ValueError as e:
+        return str(e)
+    radius = clustering_radius()
+    checklists = query_checklists(start_date, end_date, sqlEngine, tables['checklists'])
+    # the state and country geocoded at import are reused, even for clustered checklists
+    places = known_places(checklists)
+    summaries = {}
+    if not radius:
+        # the checklists table is built without clustering, its checklists differ from clustered ones
+        checklists = checklists.drop_duplicates(['date', 'location'])
+        summaries = checklists.set_index(['date', 'location']).to_dict('index')
+
+    resolve_species(start_date, end_date, sqlEngine, tables['observations'])
+    mappings = load_mappings(sqlEngine)
+    unmapped = {kind: set() for kind, mapping in mappings.items() if mapping}
+
+    cache, key, checkpoint = None, None, None
+    if isinstance(output_file, str):
+        cache = get_export_cache()
+        key = export_cache_key(start_date, end_date, sqlEngine, mappings, tables)
+        if cache.get(key, output_file, unmapped_report_file(output_file)):
+            return None
+        # a checkpoint left by an export of other data, observer or settings to the same file is discarded
+        checkpoint = open_checkpoint(f'{output_file}.checkpoint', key)
+    failed, completed = [], False
+    # written aside and renamed once complete, so that a failed export never leaves a partial file
+    target = f'{output_file}.tmp' if isinstance(output_file, str) else output_file
+    try:
+        days = fetch_days(start_date, end_date, sqlEngine, tables['observations'])
+        groups = iter_checklists(days, mappings, unmapped, radius)
+        checklists = enrich_checklists(groups, summaries, checkpoint, failed, places)
+        count = write_csv(target, checklists)
+        completed = not failed
+    except sqlalchemy.exc.OperationalError:
+        # connection lost during the export: the checkpoint is kept and nothing is cached
+        return 'Connection to the database lost, run the export again to complete it'
+    finally:
+        if checkpoint is not None:
+            checkpoint[1].close()
+        if target is not output_file and not completed and exists(target):
+            remove(target)
+    if failed:
+        return f'{len(failed)} checklist(s) failed, run the export again to complete it'
+    if target is not output_file and count:
+        replace(target, output_file)
+    if checkpoint is not None:
+        remove(f'{output_file}.checkpoint')
+    if count == 0:
         return 'Nothing to export, check if database is running!'
+    if any(unmapped.values()) and isinstance(output_file, str):
+        write_unmapped_report(output_file, unmapped)
+    if key is not None:
+        cache.put(key, output_file, unmapped_report_file(output_file) if any(unmapped.values()) else None)
+
+
+def preview_export(start_date, end_date, observer=None):
+    """
+    Counts the checklists, species and observations an export of a date range would contain, without
+    generating it. The counts are aggregated by the database over the indexed date column and do not take
+    the location clustering and name mappings into account.
+
+    :param start_date: The start date of the data to query.
+    :param end_date: The end date of the data to query. If None, all data as from start_date is counted.
+    :param observer: The observer whose observations are counted, see `observer_tables`.
+    :return: A dictionary with the 'checklists', 'species' and 'observations' totals, and 'per_day' and
+             'per_location' DataFrames with the same counts by date and by location. None if the database
+             cannot be queried.
+    """
+    sqlEngine, db = db_conn()
+    if db is None:
+        return None
+    try:
+        db = observer_tables(db, observer)['observations']
+    except ValueError:
+        return None
+    date, species = quote_name('date'), quote_name('species name')
+    location = location_sql()
+    table = f'{quote_name(db)}{date_filter(start_date, end_date)}'
+    try:
+        totals = pd.read_sql(
+            f'select count(*) as observations, count(distinct {species}) as species, '
+            f'(select count(*) from (select distinct {date}, {location} from {table}) as c) as checklists '
+            f'from {table}', con=sqlEngine)
+        per_day = pd.read_sql(
+            f'select {date} as date, count(distinct {location}) as checklists, count(distinct {species}) as species, '
+            f'count(*) as observations from {table} group by {date} order by {date}', con=sqlEngine)
+        per_location = pd.read_sql(
+            f'select {location} as location, count(distinct {date}) as checklists, '
+            f'count(distinct {species}) as species, count(*) as observations from {table} '
+            f'group by {location} order by observations desc', con=sqlEngine)
+    except (pd.errors.DatabaseError, sqlalchemy.exc.SQLAlchemyError):
+        return None
+    totals = totals.iloc[0]
+    return {
+        'checklists': int(totals['checklists']),
+        'species': int(totals['species']),
+        'observations': int(totals['observations']),
+        'per_day': per_day,
+        'per_location': per_location
+    }
 
-    grp = prepare_data(df)
-    for g in grp:
-        o, header = parse_group(g, header)
-        obs.append(o)
 
-    write_csv(output_file, header, obs, df)
+def location_sql():
+    """
+    :return: The SQL expression of the checklist location, the part of the location name before any '-',
+             as done by `prepare_data`.
+    """
+    location = quote_name('location')
+    if is_sqlite():
+        return f"substr({location}, 1, instr({location} || '-', '-') - 1)"
+    return f"substring_index({location}, '-', 1)"
+
+
+def convert_observations(d, output_file):
+    """
+    Converts observations to an eBird file directly, without going through the database.
+
+    :param d: The observations, see `read_observations`.
+    :param output_file: The path to the output file, or an open text file.
+    :return: None|str None if OK, else a status message
+    """
+    if len(d) == 0:
+        return 'Nothing to export'
+    groups = iter_checklists([compact_data(d)], radius=clustering_radius())
+    failed = []
+    count = write_csv(output_file, enrich_checklists(groups, {}, failed=failed))
+    if failed:
+        return f'{len(failed)} checklist(s) failed, run the conversion again to complete it'
+    if count == 0:
+        return 'Nothing to export'
 
 
 def main():
@@ -344,13 +1400,71 @@ def main():
         help='Export observation up to this ISO date (yyy-mm-dd)'
     )
 
+    parser.add_argument(
+        '-m',
+        '--mappings',
+        required=False,
+        help='Import species/location name mappings from a .CSV file with kind, source and target columns'
+    )
+
+    parser.add_argument(
+        '-p',
+        '--preview',
+        action='store_true',
+        help='Print the number of checklists, species and observations to export between the from and to dates'
+    )
+
+    parser.add_argument(
+        '-u',
+        '--observer',
+        required=False,
+        help='Import, preview or export the observations of this observer, kept in their own tables. '
+             'Defaults to the observer of the default config section'
+    )
+
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        required=False,
+        help='Run the import and export jobs of a YAML file in one process, see jobs.py'
+    )
+
+    parser.add_argument(
+        '-r',
+        '--report',
+        required=False,
+        help='Write the JSON timing report of the --jobs run to this file instead of printing it'
+    )
+
     args = parser.parse_args()
+    observer = default_observer(args.observer)
+
+    if args.jobs:
+        from jobs import run_jobs_file
+        status = run_jobs_file(args.jobs, args.report)
+        if status is not None:
+            print(status)
+        return
+
+    if args.mappings:
+        import_mappings(args.mappings)
 
     if args.import_obs:
-        import_obs(args.import_obs)
+        import_obs(args.import_obs, observer=observer)
+
+    if args.preview:
+        preview = preview_export(args.from_date, args.to_date, observer)
+        if preview is None:
+            print('Cannot query the database')
+        else:
+            print(f"{preview['checklists']} checklists, {preview['species']} species, "
+                  f"{preview['observations']} observations")
+            print(preview['per_day'].to_string(index=False))
 
     if args.ebird_output_file:
-        export_to_ebird(args.ebird_output_file, args.from_date, args.to_date)
+        status = export_to_ebird(args.ebird_output_file, args.from_date, args.to_date, observer)
+        if status is not None:
+            print(status)
 
 
 if __name__ == "__main__":
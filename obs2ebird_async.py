@@ -0,0 +1,102 @@
+"""
+"   Asynchronous API of the observation.org to eBird.org conversion, e.g. to embed it in a web service
+"
+"   The config is given explicitly to each call and the blocking database and geocoding work runs in an
+"   executor, so that several conversions with different configs can run concurrently in one process.
+"
+"   Example:
+"       ebird = await convert_async(request_body, config)
+"       status = await import_obs_async(open('observations.csv', 'rb'), config)
+"       ebird = await export_to_ebird_async('2023-01-01', '2023-12-31', config)
+"       ebird = await export_to_ebird_async('2023-01-01', '2023-12-31', config, observer='jdoe')
+"
+"""
+import asyncio
+import contextvars
+import functools
+import io
+
+import obs2ebird
+
+
+async def run_blocking(func, *args, executor=None):
+    """
+    Runs a blocking function in an executor, in a copy of the current context.
+
+    :param func: The function to run.
+    :param args: Its arguments.
+    :param executor: A concurrent.futures executor, the event loop default executor if None.
+    :return: The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, func, *args))
+
+
+def _as_stream(data):
+    """
+    :param data: CSV content as bytes, or a binary or text stream.
+    :return: A stream readable by pandas.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return io.BytesIO(data)
+    return data
+
+
+def _with_config(config, func, *args):
+    with obs2ebird.use_config(config):
+        return func(*args)
+
+
+def _export(config, start_date, end_date, observer=None):
+    out = io.StringIO()
+    status = _with_config(config, obs2ebird.export_to_ebird, out, start_date, end_date, observer)
+    return status, io.BytesIO(out.getvalue().encode())
+
+
+def _convert(config, data):
+    out = io.StringIO()
+    d = obs2ebird.read_observations(_as_stream(data))
+    status = _with_config(config, obs2ebird.convert_observations, d, out)
+    return status, io.BytesIO(out.getvalue().encode())
+
+
+async def import_obs_async(data, config, executor=None, observer=None):
+    """
+    Imports observation.org data into the database of the given config.
+
+    :param data: The observation.org CSV content, as bytes or a stream.
+    :param config: A config dictionary, as returned by `get_config`.
+    :param executor: The executor running the blocking parts, the event loop default executor if None.
+    :param observer: The observer whose observations are replaced, see `obs2ebird.observer_tables`.
+    :return: None|str  A status string is return in case of error
+    """
+    d = await run_blocking(obs2ebird.read_observations, _as_stream(data), executor=executor)
+    return await run_blocking(_with_config, config, obs2ebird.save_observations, d, observer, executor=executor)
+
+
+async def export_to_ebird_async(start_date, end_date, config, executor=None, observer=None):
+    """
+    Exports the observations of the database of the given config to the eBird format.
+
+    :param start_date: The start date for querying the database.
+    :param end_date: The end date for querying the database. If None, all data as from start_date is exported.
+    :param config: A config dictionary, as returned by `get_config`.
+    :param executor: The executor running the blocking parts, the event loop default executor if None.
+    :param observer: The observer whose observations are exported, see `obs2ebird.observer_tables`.
+    :return: A (status, stream) tuple: status is None if OK, else a message, and stream is a binary
+             stream with the UTF-8 eBird CSV file.
+    """
+    return await run_blocking(_export, config, start_date, end_date, observer, executor=executor)
+
+
+async def convert_async(data, config, executor=None):
+    """
+    Converts observation.org data to the eBird format in memory, without using the database.
+
+    :param data: The observation.org CSV content, as bytes or a stream.
+    :param config: A config dictionary, as returned by `get_config`.
+    :param executor: The executor running the blocking parts, the event loop default executor if None.
+    :return: A (status, stream) tuple, see `export_to_ebird_async`.
+    """
+    return await run_blocking(_convert, config, data, executor=executor)
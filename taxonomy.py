@@ -0,0 +1,142 @@
+"""
+"   Fuzzy matching of species names against a local eBird taxonomy file
+"
+"   The taxonomy (e.g. eBird_Taxonomy_v2023.csv downloaded from ebird.org) is loaded once and indexed by
+"   character trigrams. Names are resolved in batch: the scientific name is looked up first, then the
+"   common or scientific name sharing most trigrams is selected, scored by the Dice coefficient.
+"
+"   Example:
+"       matcher = get_matcher('eBird_Taxonomy_v2023.csv')
+"       matcher.match_all(['Blackbird', 'Common Chafinch'])
+"       {'Blackbird': ('Eurasian Blackbird', 0.62), 'Common Chafinch': ('Common Chaffinch', 0.91)}
+"
+"""
+import unicodedata
+from os import stat
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+COMMON_NAME_COLUMNS = ('PRIMARY_COM_NAME', 'COMMON_NAME', 'English name', 'common name')
+SCI_NAME_COLUMNS = ('SCI_NAME', 'SCIENTIFIC_NAME', 'scientific name')
+
+# matchers by taxonomy file, see get_matcher
+_matchers = {}
+_lock = Lock()
+
+
+def normalize(name):
+    """
+    :param name: A species name.
+    :return: The name in lower case, without accents and punctuation.
+    """
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c if c.isalnum() else ' ' for c in name if not unicodedata.combining(c))
+    return ' '.join(name.lower().split())
+
+
+def trigrams(name):
+    """
+    :param name: A normalized name.
+    :return: The set of its character trigrams, padded at the start and end of the name.
+    """
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _column(df, candidates):
+    lower = {c.lower(): c for c in df.columns}
+    for c in candidates:
+        if c.lower() in lower:
+            return lower[c.lower()]
+    raise KeyError(f'None of the columns {candidates} in the taxonomy file')
+
+
+class TaxonomyMatcher:
+    """
+    Trigram index of the common and scientific names of the eBird taxonomy.
+    """
+
+    def __init__(self, taxonomy_file):
+        df = pd.read_csv(taxonomy_file, dtype=str, encoding='UTF_8').fillna('')
+        common = df[_column(df, COMMON_NAME_COLUMNS)].tolist()
+        sci = df[_column(df, SCI_NAME_COLUMNS)].tolist()
+        # every common and scientific name is indexed, and resolves to the eBird common name
+        self.targets = common + common
+        self.names = [normalize(x) for x in common + sci]
+        self.sci_names = {normalize(x): name for x, name in zip(sci, common)}
+        self.common_names = {normalize(x): x for x in common}
+        index = {}
+        self.sizes = np.zeros(len(self.names), dtype=np.int32)
+        for i, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes[i] = len(grams)
+            for g in grams:
+                index.setdefault(g, []).append(i)
+        self.index = {g: np.array(ids, dtype=np.int32) for g, ids in index.items()}
+
+    def closest(self, name):
+        """
+        :param name: A normalized name.
+        :return: A (id, score) tuple of the indexed name sharing most trigrams with the name, scored by the
+                 Dice coefficient of their trigram sets. (None, 0) if no trigram is shared.
+        """
+        grams = trigrams(name)
+        postings = [self.index[g] for g in grams if g in self.index]
+        if not postings:
+            return None, 0.0
+        ids, shared = np.unique(np.concatenate(postings), return_counts=True)
+        dice = 2 * shared / (self.sizes[ids] + len(grams))
+        best = int(np.argmax(dice))
+        return int(ids[best]), float(dice[best])
+
+    def match(self, name, sci_name=''):
+        """
+        :param name: The species name to match.
+        :param sci_name: Its scientific name, if known.
+        :return: A (eBird common name, score) tuple, score between 0 and 1. (None, 0) if nothing matches.
+        """
+        key, sci_key = normalize(name), normalize(sci_name)
+        if sci_key in self.sci_names:
+            return self.sci_names[sci_key], 1.0
+        if key in self.common_names:
+            return self.common_names[key], 1.0
+        if key in self.sci_names:
+            return self.sci_names[key], 1.0
+        best, best_score = None, 0.0
+        for query in (key, sci_key):
+            if query == '':
+                continue
+            i, score = self.closest(query)
+            if score > best_score:
+                best, best_score = self.targets[i], score
+        return best, round(best_score, 3)
+
+    def match_all(self, names, sci_names=None):
+        """
+        Matches a batch of names, each distinct name being matched once.
+
+        :param names: An iterable of species names.
+        :param sci_names: The scientific names of the species, in the same order, if known.
+        :return: A {name: (eBird common name, score)} dictionary, see `match`.
+        """
+        names = list(names)
+        sci_names = [''] * len(names) if sci_names is None else list(sci_names)
+        result = {}
+        for name, sci_name in zip(names, sci_names):
+            if name not in result:
+                result[name] = self.match(name, sci_name)
+        return result
+
+
+def get_matcher(taxonomy_file):
+    """
+    :param taxonomy_file: The path to the eBird taxonomy CSV file.
+    :return: The TaxonomyMatcher of the file, built once and kept until the file changes.
+    """
+    stamp = stat(taxonomy_file).st_mtime_ns
+    with _lock:
+        if _matchers.get(taxonomy_file, (None,))[0] != stamp:
+            _matchers[taxonomy_file] = (stamp, TaxonomyMatcher(taxonomy_file))
+        return _matchers[taxonomy_file][1]